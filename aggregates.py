@@ -0,0 +1,235 @@
+"""Materialized per-habit aggregates, updated in O(1) on every toggle.
+
+Run as a script to rebuild the store from the full history and report any
+drift from the incrementally maintained values:
+
+    python aggregates.py [--rebuild]
+"""
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from stats import streak_runs
+
+# Configuration
+HABITS_AGGREGATES_FILE = 'habits.aggregates.db'
+# Bumped when the tables change; older stores are rebuilt on first use
+_SCHEMA_VERSION = 1
+
+
+def _periods(day):
+    """Returns the ISO week and month keys a day is counted under."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}", day.strftime('%Y-%m')
+
+
+class AggregateStore:
+    """Per-habit totals, streaks and per-week/month counts in SQLite.
+
+    The streak columns describe the most recent run of completed days
+    (its last day and length) plus the longest run seen. Changes on or after
+    that run's last day are applied in O(1); anything else falls back to
+    recomputing that one habit's streaks.
+
+    habit_days records which cells are done, so a change is only counted if
+    it flips the recorded cell. Two sessions ticking the same cell from the
+    same loaded frame therefore count it once.
+    """
+
+    def __init__(self, path=HABITS_AGGREGATES_FILE):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS habit_totals (
+                habit TEXT PRIMARY KEY,
+                completed INTEGER NOT NULL DEFAULT 0,
+                streak_end TEXT,
+                streak_length INTEGER NOT NULL DEFAULT 0,
+                longest INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS habit_periods (
+                habit TEXT NOT NULL,
+                period TEXT NOT NULL,
+                completed INTEGER NOT NULL,
+                PRIMARY KEY (habit, period)
+            );
+            CREATE TABLE IF NOT EXISTS habit_days (
+                habit TEXT NOT NULL,
+                day TEXT NOT NULL,
+                PRIMARY KEY (habit, day)
+            ) WITHOUT ROWID;
+        """)
+        return conn
+
+    def habits(self):
+        with closing(self._connect()) as conn:
+            return {row[0] for row in conn.execute('SELECT habit FROM habit_totals')}
+
+    def matches(self, habits):
+        """True if the store is up to date and tracks exactly the given habits."""
+        with closing(self._connect()) as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        return version == _SCHEMA_VERSION and self.habits() == set(habits)
+
+    def rebuild(self, df):
+        """Recomputes every aggregate from the full history."""
+        snapshot = compute_aggregates(df)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM habit_totals')
+            conn.execute('DELETE FROM habit_periods')
+            conn.execute('DELETE FROM habit_days')
+            conn.executemany(
+                'INSERT INTO habit_totals VALUES (?, ?, ?, ?, ?)',
+                [(habit, *row) for habit, row in snapshot['totals'].items()])
+            conn.executemany(
+                'INSERT INTO habit_periods VALUES (?, ?, ?)',
+                [(habit, period, count)
+                 for (habit, period), count in snapshot['periods'].items()])
+            conn.executemany('INSERT INTO habit_days VALUES (?, ?)', snapshot['days'])
+            conn.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+
+    def add_habit(self, habit):
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR IGNORE INTO habit_totals (habit) VALUES (?)', (habit,))
+
+    def apply_change(self, day, habit, value):
+        """Applies a single toggle, unless the cell already has that value."""
+        day = pd.Timestamp(day).date()
+        delta = 1 if value else -1
+        with closing(self._connect()) as conn, conn:
+            if value:
+                flipped = conn.execute('INSERT OR IGNORE INTO habit_days VALUES (?, ?)',
+                                       (habit, day.isoformat())).rowcount
+            else:
+                flipped = conn.execute('DELETE FROM habit_days WHERE habit = ? AND day = ?',
+                                       (habit, day.isoformat())).rowcount
+            if not flipped:
+                return  # Already counted, e.g. by another session
+            conn.execute('INSERT OR IGNORE INTO habit_totals (habit) VALUES (?)', (habit,))
+            conn.execute('UPDATE habit_totals SET completed = completed + ? WHERE habit = ?',
+                         (delta, habit))
+            for period in _periods(day):
+                conn.execute(
+                    'INSERT INTO habit_periods VALUES (?, ?, ?) '
+                    'ON CONFLICT (habit, period) DO UPDATE SET completed = completed + ?',
+                    (habit, period, max(delta, 0), delta))
+
+            end, length, longest = conn.execute(
+                'SELECT streak_end, streak_length, longest FROM habit_totals WHERE habit = ?',
+                (habit,)).fetchone()
+            end = date.fromisoformat(end) if end else None
+            if value and (end is None or day > end + timedelta(days=1)):
+                end, length = day, 1
+            elif value and day == end + timedelta(days=1):
+                end, length = day, length + 1
+            elif not value and end is not None and day > end:
+                pass  # Already outside the latest run
+            elif not value and day == end and 1 < length < longest:
+                end, length = day - timedelta(days=1), length - 1
+            else:
+                # An edit inside the run, removing it entirely (the previous
+                # run becomes the latest) or shortening the longest run
+                end, length, longest = _stored_streaks(conn, habit)
+            conn.execute(
+                'UPDATE habit_totals SET streak_end = ?, streak_length = ?, longest = ? '
+                'WHERE habit = ?',
+                (end.isoformat() if end else None, length, max(longest, length), habit))
+
+    def current_streaks(self, today=None):
+        """Returns {habit: (current streak, longest streak)}.
+
+        The latest run only counts as current if it reaches today or yesterday.
+        """
+        today = today or date.today()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT habit, streak_end, streak_length, longest FROM habit_totals').fetchall()
+        streaks = {}
+        for habit, end, length, longest in rows:
+            live = end is not None and date.fromisoformat(end) >= today - timedelta(days=1)
+            streaks[habit] = (length if live else 0, longest)
+        return streaks
+
+    def snapshot(self):
+        """Returns the stored aggregates in the same shape as compute_aggregates()."""
+        with closing(self._connect()) as conn:
+            totals = {row[0]: row[1:] for row in conn.execute('SELECT * FROM habit_totals')}
+            periods = {(habit, period): count for habit, period, count in conn.execute(
+                'SELECT habit, period, completed FROM habit_periods WHERE completed > 0')}
+        return {'totals': totals, 'periods': periods}
+
+
+def _stored_streaks(conn, habit):
+    """Returns (last day, length, longest) of one habit's runs in habit_days."""
+    ordinals = np.array([date.fromisoformat(day).toordinal() for (day,) in conn.execute(
+        'SELECT day FROM habit_days WHERE habit = ? ORDER BY day', (habit,))], dtype=np.int64)
+    if not len(ordinals):
+        return None, 0, 0
+    # A run starts wherever the previous completed day is not the day before
+    starts = np.flatnonzero(np.diff(ordinals, prepend=ordinals[0] - 2) != 1)
+    lengths = np.diff(np.append(starts, len(ordinals)))
+    return date.fromordinal(int(ordinals[-1])), int(lengths[-1]), int(lengths.max())
+
+def compute_aggregates(df):
+    """Computes every aggregate from the full history in one vectorized pass."""
+    habits = [col for col in df.columns if col != 'Date']
+    runs = streak_runs(df)
+    latest = runs.groupby('Habit').last()
+    longest = runs.groupby('Habit')['Length'].max()
+
+    done = df.melt(id_vars='Date', value_vars=habits, var_name='Habit', value_name='Done')
+    done = done[done['Done'].astype(bool)]
+    dates = done['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    iso = dates.dt.isocalendar()
+    weeks = iso['year'].astype(str) + '-W' + iso['week'].astype(str).str.zfill(2)
+    months = dates.dt.strftime('%Y-%m')
+    counts = pd.concat([
+        done.groupby(['Habit', weeks]).size(),
+        done.groupby(['Habit', months]).size(),
+    ])
+    completed = done.groupby('Habit').size()
+
+    totals = {}
+    for habit in habits:
+        if habit in latest.index:
+            end = latest.at[habit, 'End'].date().isoformat()
+            length, best = int(latest.at[habit, 'Length']), int(longest[habit])
+        else:
+            end, length, best = None, 0, 0
+        totals[habit] = (int(completed.get(habit, 0)), end, length, best)
+    return {'totals': totals,
+            'periods': {key: int(count) for key, count in counts.items()},
+            'days': list(zip(done['Habit'], dates.dt.strftime('%Y-%m-%d')))}
+
+def verify(store, df):
+    """Returns a list of differences between the store and a full recompute."""
+    expected, actual = compute_aggregates(df), store.snapshot()
+    problems = []
+    for section in ('totals', 'periods'):
+        for key in sorted(set(expected[section]) | set(actual[section]), key=str):
+            want, got = expected[section].get(key), actual[section].get(key)
+            if want != got:
+                problems.append(f"{section} {key}: stored {got}, expected {want}")
+    return problems
+
+
+if __name__ == '__main__':
+    import sys
+    from storage import get_storage
+
+    df = get_storage().load()
+    store = AggregateStore()
+    problems = verify(store, df)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} difference(s) from a full recompute")
+    if '--rebuild' in sys.argv[1:]:
+        store.rebuild(df)
+        print(f"Rebuilt {store.path}")
@@ -0,0 +1,8 @@
+"""Benchmarks for the habit tracker's data path.
+
+Run the modules from the repo root, e.g. python -m benchmarks.rerun_scaling
+"""
+import streamlit.logger
+
+# Outside `streamlit run`, every cached call logs a bare-mode warning
+streamlit.logger.set_log_level('error')
@@ -0,0 +1,43 @@
+"""Synthetic habit history generator.
+
+    python -m benchmarks.generate --days 3650 --habits 50 --density 0.6 -o habits.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+def generate_history(days, habits, density=0.6, seed=0, end=None):
+    """Returns a wide habit frame with one row per day ending at end.
+
+    end defaults to yesterday, so loading the result still exercises
+    ensure_today_exists adding today's row. The same seed always produces
+    the same values.
+    """
+    rng = np.random.default_rng(seed)
+    if end is None:
+        end = pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+    values = rng.random((days, habits)) < density
+    df = pd.DataFrame(values, columns=[f'Habit {i}' for i in range(habits)])
+    df.insert(0, 'Date', pd.date_range(end=end, periods=days))
+    return df
+
+def write_history(path, days, habits, density=0.6, seed=0, end=None):
+    """Writes a generated history in the same CSV layout the app saves."""
+    generate_history(days, habits, density, seed, end).to_csv(path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--habits', type=int, default=10)
+    parser.add_argument('--density', type=float, default=0.6,
+                        help="fraction of (day, habit) cells that are completed")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', type=pd.Timestamp, default=None,
+                        help="last date in the history (default: yesterday)")
+    parser.add_argument('-o', '--output', default='habits.csv')
+    args = parser.parse_args()
+    write_history(args.output, args.days, args.habits, args.density, args.seed, args.end)
+    print(f"Wrote {args.days} days x {args.habits} habits to {args.output}")
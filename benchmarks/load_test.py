@@ -0,0 +1,111 @@
+"""Headless load test: N concurrent sessions driving the app through AppTest.
+
+Each session is its own AppTest instance running in its own thread against
+one shared data directory, like browser tabs on a single server. Sessions
+mostly toggle today's checkboxes and occasionally add a habit:
+
+    python -m benchmarks.load_test --sessions 8 --actions 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import storage
+from benchmarks.generate import write_history
+from benchmarks.suite import APP_SCRIPT, REPO_ROOT
+
+
+def run_session(session_id, actions, add_probability, seed, latencies, errors, start_barrier):
+    """Drives one session and appends each rerun's latency in seconds."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + session_id)
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=120)
+    app.run()
+    start_barrier.wait()
+    for action in range(actions):
+        if rng.random() < add_probability:
+            app.sidebar.text_input[0].input(f"Session {session_id} habit {action}")
+            app.sidebar.button[0].click()
+        elif len(app.checkbox):
+            box = app.checkbox[rng.randrange(len(app.checkbox))]
+            box.uncheck() if box.value else box.check()
+        start = time.perf_counter()
+        app.run()
+        latencies.append(time.perf_counter() - start)
+        if app.exception:
+            errors.append(f"session {session_id}: {app.exception[0].message}")
+
+def run_load_test(sessions, actions, days=365, habits=10, add_probability=0.02, seed=0):
+    """Runs the load test in a scratch directory and returns the report dict."""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    latencies, errors = [], []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_history(storage.HABITS_FILE, days, habits, seed=seed)
+            # Sessions warm up first so the clock only covers steady-state reruns
+            start_barrier = threading.Barrier(sessions + 1)
+            threads = [threading.Thread(
+                target=run_session,
+                args=(i, actions, add_probability, seed, latencies, errors, start_barrier))
+                for i in range(sessions)]
+            for thread in threads:
+                thread.start()
+            start_barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    ms = np.array(latencies) * 1000
+    return {
+        'sessions': sessions,
+        'actions_per_session': actions,
+        'days': days,
+        'habits': habits,
+        'reruns': len(latencies),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(ms, 50)) if len(ms) else None,
+        'p95_ms': float(np.percentile(ms, 95)) if len(ms) else None,
+        'p99_ms': float(np.percentile(ms, 99)) if len(ms) else None,
+        'errors': errors,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--actions', type=int, default=25,
+                        help="reruns triggered by each session")
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--habits', type=int, default=10)
+    parser.add_argument('--add-probability', type=float, default=0.02,
+                        help="chance that an action adds a habit instead of toggling")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = run_load_test(args.sessions, args.actions, args.days, args.habits,
+                           args.add_probability, args.seed)
+    print(f"{report['sessions']} sessions, {report['reruns']} reruns in "
+          f"{report['elapsed_s']:.2f}s ({report['throughput_rps']:.1f} reruns/s)")
+    print(f"p50 {report['p50_ms']:.1f} ms  p95 {report['p95_ms']:.1f} ms  "
+          f"p99 {report['p99_ms']:.1f} ms")
+    for error in report['errors']:
+        print(f"error: {error}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,53 @@
+"""Times a warm rerun's data path for growing history lengths.
+
+The per-rerun work (cached load, ensure_today_exists and today's row lookup)
+should stay flat as the history grows, since dates stay typed from load to
+save and nothing scans or reformats the Date column. Run from the repo root:
+
+    python -m benchmarks.rerun_scaling
+"""
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+import storage
+from benchmarks.generate import write_history
+from storage import ensure_today_exists, find_day
+
+YEARS = (1, 5, 10, 20)
+HABITS = 20
+REPEATS = 50
+
+
+def time_rerun(repeats=REPEATS):
+    """Returns the median seconds for one warm rerun's data path."""
+    today = pd.Timestamp.today().normalize()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        habit_storage = storage.get_storage()
+        df = habit_storage.load()
+        df = ensure_today_exists(df, habit_storage.data_token())
+        find_day(df, today)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def main():
+    print(f"{'days':>6}  {'rerun (ms)':>10}")
+    cwd = os.getcwd()
+    for years in YEARS:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                write_history(storage.HABITS_FILE, years * 365, HABITS)
+                storage.get_storage().load()  # Warm the cache
+                print(f"{years * 365:>6}  {time_rerun() * 1000:>10.3f}")
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
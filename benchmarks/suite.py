@@ -0,0 +1,165 @@
+"""Benchmark suite for the habit data path and a full scripted rerun.
+
+Generates a history for every (days, habits) combination, times each
+operation and writes a JSON report with the environment it ran in, so runs
+can be compared across releases:
+
+    python -m benchmarks.suite --days 365 3650 --habits 10 50 -o bench_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit
+
+import storage
+from benchmarks.generate import write_history
+from stats import rolling_stats
+from storage import add_habit, ensure_today_exists, fill_missing_days, get_storage
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SCRIPT = os.path.join(REPO_ROOT, 'streamlit_app.py')
+
+
+def _measure(fn, repeats, setup=None):
+    """Returns timing stats in milliseconds for repeats calls of fn(setup())."""
+    samples = []
+    for _ in range(repeats):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_ms': samples[0],
+        'repeats': repeats,
+    }
+
+def _time_rerun(repeats):
+    """Times full script reruns of the app through Streamlit's AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=60)
+    app.run()  # First run pays for imports and cache fills
+    return _measure(lambda _: app.run(), repeats)
+
+def benchmark_size(days, habits, density, seed, repeats, rerun=True):
+    """Runs every operation against one generated history in a scratch dir."""
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_history(storage.HABITS_FILE, days, habits, density, seed)
+            # The configured backend, as the app gets it; the first load
+            # imports the generated CSV into the backend's own file
+            habit_storage = get_storage()
+            habit_storage.load()
+            file_bytes = os.path.getsize(habit_storage.location)
+
+            def cold_load(_):
+                storage.invalidate_habit_cache(habit_storage.location)
+                habit_storage.load()
+
+            results['load (cold)'] = _measure(cold_load, repeats)
+            results['load (warm)'] = _measure(lambda _: habit_storage.load(), repeats)
+            df = habit_storage.load()
+            results['ensure_today_exists'] = _measure(
+                ensure_today_exists, repeats, setup=df.copy)
+            # A third of the days kept, so every rerun has gaps to fill
+            gappy = df.iloc[::3].reset_index(drop=True)
+            results['fill_missing_days'] = _measure(
+                fill_missing_days, repeats, setup=gappy.copy)
+            gappy_token = ('benchmark gaps', days, habits)
+            ensure_today_exists(gappy, gappy_token)
+            results['ensure_today_exists (cached)'] = _measure(
+                lambda _: ensure_today_exists(gappy, gappy_token), repeats)
+            results['add_habit'] = _measure(
+                lambda frame: add_habit('Benchmark habit', frame), repeats, setup=df.copy)
+            day, habit = df['Date'].iat[-1], df.columns[1]
+            results['save_changes (one cell)'] = _measure(
+                lambda _: habit_storage.save_changes(df, day, {habit: not df[habit].iat[-1]}),
+                repeats)
+            results['save'] = _measure(lambda _: habit_storage.save(df), repeats)
+            results['rolling_stats'] = _measure(lambda _: rolling_stats(df), repeats)
+            # Any token works here; the app uses the storage's data_token()
+            token = ('benchmark', days, habits)
+            rolling_stats(df, token)
+            results['rolling_stats (cached)'] = _measure(
+                lambda _: rolling_stats(df, token), repeats)
+            if rerun:
+                results['full rerun'] = _time_rerun(repeats)
+        finally:
+            os.chdir(cwd)
+    return [{'days': days, 'habits': habits, 'density': density,
+             'file_bytes': file_bytes, 'operation': name, **stats}
+            for name, stats in results.items()]
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(days_list, habits_list, density=0.6, seed=0, repeats=20, rerun=True):
+    """Runs the whole matrix and returns the report as a dict."""
+    # AppTest imports the app's modules after we chdir into scratch dirs
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    results = []
+    for days in days_list:
+        for habits in habits_list:
+            results.extend(benchmark_size(days, habits, density, seed, repeats, rerun))
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'streamlit': streamlit.__version__,
+        },
+        'config': {'density': density, 'seed': seed, 'repeats': repeats,
+                   'storage_backend': storage.STORAGE_BACKEND},
+        'results': results,
+    }
+
+def format_report(report):
+    lines = [f"{'days':>6} {'habits':>6}  {'operation':<28} {'median ms':>10} {'p95 ms':>10}"]
+    for row in report['results']:
+        lines.append(f"{row['days']:>6} {row['habits']:>6}  {row['operation']:<28} "
+                     f"{row['median_ms']:>10.3f} {row['p95_ms']:>10.3f}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[365, 3650])
+    parser.add_argument('--habits', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--density', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--no-rerun', action='store_true',
+                        help="skip the full scripted rerun through AppTest")
+    parser.add_argument('-o', '--output', default='bench_report.json')
+    args = parser.parse_args()
+
+    report = run_suite(args.days, args.habits, args.density, args.seed,
+                       args.repeats, rerun=not args.no_rerun)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(format_report(report))
+    print(f"\nWrote {args.output}")
@@ -0,0 +1,113 @@
+"""Packed bit-array representation of habit completion history."""
+import numpy as np
+import pandas as pd
+
+
+def _to_day(day):
+    """Converts a date, Timestamp or 'YYYY-MM-DD' string to datetime64[D]."""
+    return np.datetime64(pd.Timestamp(day).date(), 'D')
+
+
+class HabitBitset:
+    """Habit history stored as one bit per habit per day.
+
+    Bit d of a row is the value for day epoch + d. A separate 'present' row
+    marks which days have been recorded at all, so the frame view only shows
+    the dates the app actually created. A habit costs one bit per day instead
+    of a pandas bool or object cell.
+    """
+
+    def __init__(self, epoch, habits, bits, present):
+        self.epoch = np.datetime64(epoch, 'D')
+        self.habits = list(habits)
+        # uint8 array of shape (len(habits), n_bytes), little bit order
+        self.bits = bits
+        self.present = present
+
+    @classmethod
+    def empty(cls, habits=(), epoch=None):
+        epoch = _to_day(pd.Timestamp.today()) if epoch is None else epoch
+        return cls(epoch, habits, np.zeros((len(habits), 0), dtype=np.uint8),
+                   np.zeros(0, dtype=np.uint8))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Packs a wide frame with a Date column and boolean habit columns."""
+        habits = [col for col in df.columns if col != 'Date']
+        if df.empty:
+            return cls.empty(habits)
+        days = pd.to_datetime(df['Date']).values.astype('datetime64[D]')
+        epoch = days.min()
+        offsets = (days - epoch).astype(np.int64)
+        n_days = int(offsets.max()) + 1
+
+        dense = np.zeros((len(habits), n_days), dtype=bool)
+        for i, habit in enumerate(habits):
+            dense[i, offsets] = df[habit].to_numpy(dtype=bool)
+        present = np.zeros(n_days, dtype=bool)
+        present[offsets] = True
+        return cls(epoch, habits,
+                   np.packbits(dense, axis=1, bitorder='little'),
+                   np.packbits(present, bitorder='little'))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['epoch'][()], data['habits'].tolist(),
+                       data['bits'], data['present'])
+
+    def save(self, path):
+        """Writes the packed arrays to an .npz file path or binary file object."""
+        np.savez(path, epoch=self.epoch, bits=self.bits, present=self.present,
+                 habits=np.array(self.habits, dtype=str))
+
+    def copy(self):
+        return HabitBitset(self.epoch, self.habits, self.bits.copy(), self.present.copy())
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes + self.present.nbytes
+
+    def to_frame(self, exclude=()):
+        """Returns the wide frame, without the habits named in exclude."""
+        rows = [i for i, habit in enumerate(self.habits) if habit not in exclude]
+        offsets = np.flatnonzero(np.unpackbits(self.present, bitorder='little'))
+        dense = np.unpackbits(self.bits[rows], axis=1, bitorder='little')[:, offsets].astype(bool)
+        columns = {'Date': pd.to_datetime(self.epoch + offsets)}
+        columns.update(zip((self.habits[i] for i in rows), dense))
+        return pd.DataFrame(columns)
+
+    def _offset(self, day):
+        """Returns the bit offset of day, growing the arrays to cover it."""
+        offset = int((_to_day(day) - self.epoch).astype(np.int64))
+        if offset < 0:
+            # Re-base on the earlier day by prepending whole bytes
+            shift = -(offset // 8)
+            self.epoch -= np.timedelta64(shift * 8, 'D')
+            self.bits = np.pad(self.bits, ((0, 0), (shift, 0)))
+            self.present = np.pad(self.present, (shift, 0))
+            offset += shift * 8
+        n_bytes = offset // 8 + 1
+        if n_bytes > self.present.size:
+            # Grow geometrically so a daily append is amortised O(1)
+            extra = max(n_bytes - self.present.size, self.present.size // 2, 8)
+            self.bits = np.pad(self.bits, ((0, 0), (0, extra)))
+            self.present = np.pad(self.present, (0, extra))
+        return offset
+
+    def add_habit(self, habit):
+        if habit not in self.habits:
+            self.habits.append(habit)
+            self.bits = np.vstack([self.bits, np.zeros((1, self.present.size), dtype=np.uint8)])
+
+    def set(self, day, habit, value):
+        """Sets one habit on one day, recording the day as present."""
+        self.add_habit(habit)
+        offset = self._offset(day)
+        byte, mask = offset >> 3, np.uint8(1 << (offset & 7))
+        self.present[byte] |= mask
+        row = self.habits.index(habit)
+        if value:
+            self.bits[row, byte] |= mask
+        else:
+            self.bits[row, byte] &= ~mask
@@ -0,0 +1,82 @@
+"""Sparse long-format representation of habit completion history."""
+import numpy as np
+import pandas as pd
+
+
+class HabitEvents:
+    """Habit history stored as the list of completed (date, habit) events.
+
+    Nothing is stored for a habit that was not done, so adding a habit is
+    O(1) and memory grows with completions rather than days x habits. The
+    wide frame the app works on is only built by to_frame(), with a row for
+    every date that has at least one completion.
+    """
+
+    def __init__(self, habits, events):
+        self.habits = list(habits)
+        # One row per completion: a datetime64 'Date' and a categorical
+        # 'Habit', so each event stores a small code instead of a string
+        if not isinstance(events['Habit'].dtype, pd.CategoricalDtype):
+            events = events.assign(Habit=events['Habit'].astype('category'))
+        self.events = events
+
+    @classmethod
+    def empty(cls, habits=()):
+        return cls(habits, pd.DataFrame({'Date': pd.to_datetime([]),
+                                         'Habit': pd.Categorical([])}))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Collects the True cells of a wide frame with boolean habit columns."""
+        habits = [col for col in df.columns if col != 'Date']
+        if df.empty or not habits:
+            return cls.empty(habits)
+        long_df = df.melt(id_vars='Date', value_vars=habits,
+                          var_name='Habit', value_name='Done')
+        events = long_df.loc[long_df['Done'].to_numpy(dtype=bool), ['Date', 'Habit']]
+        events['Date'] = pd.to_datetime(events['Date'])
+        return cls(habits, events.reset_index(drop=True))
+
+    def copy(self):
+        return HabitEvents(self.habits, self.events.copy())
+
+    @property
+    def nbytes(self):
+        return int(self.events.memory_usage(index=True, deep=True).sum())
+
+    def add_habit(self, habit):
+        if habit not in self.habits:
+            self.habits.append(habit)
+
+    def set(self, day, habit, value):
+        """Records habit as done (an event) or not done (no event) on day."""
+        self.add_habit(habit)
+        habits = self.events['Habit']
+        if habit not in habits.cat.categories:
+            habits = habits.cat.add_categories([habit])
+        hit = (self.events['Date'] == pd.Timestamp(day)).to_numpy() & (habits == habit).to_numpy()
+        if value and not hit.any():
+            event = pd.DataFrame({
+                'Date': pd.to_datetime([day]).astype(self.events['Date'].dtype),
+                'Habit': pd.Categorical([habit], categories=habits.cat.categories)})
+            self.events = pd.concat([self.events.assign(Habit=habits), event],
+                                    ignore_index=True)
+        elif not value and hit.any():
+            self.events = self.events[~hit].reset_index(drop=True)
+
+    def to_frame(self, exclude=()):
+        """Returns the wide frame, without the habits named in exclude."""
+        habits = [habit for habit in self.habits if habit not in exclude]
+        dates = pd.DatetimeIndex(self.events['Date'].unique()).sort_values()
+        dense = np.zeros((len(dates), len(habits)), dtype=bool)
+        rows = dates.get_indexer(self.events['Date'])
+        # Map each category once, then every event through its code
+        codes = self.events['Habit'].cat.codes.to_numpy()
+        lookup = pd.Index(habits).get_indexer(self.events['Habit'].cat.categories)
+        cols = np.where(codes >= 0, lookup[codes], -1)
+        # Events of excluded habits, or of ones no longer registered, are ignored
+        known = cols >= 0
+        dense[rows[known], cols[known]] = True
+        columns = {'Date': dates}
+        columns.update(zip(habits, dense.T))
+        return pd.DataFrame(columns)
@@ -0,0 +1,129 @@
+"""GitHub-style calendar heatmaps built from cached per-year tiles.
+
+A tile holds one calendar year of completions laid out by week and weekday.
+Tiles live in a process-wide cache and are only rebuilt when a write
+touches their year, so paging through a long history, or toggling today,
+leaves every other year's tile alone.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from storage import coerce_habit_columns, slice_days
+
+# Configuration
+# Most tiles kept across all users and years before the oldest is dropped
+HEATMAP_MAX_TILES = 512
+WEEKDAY_LABELS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+class YearTile(namedtuple('YearTile', 'year habits days done')):
+    """One year of completions.
+
+    days has a row per calendar day with its Date, Week (columns from the
+    week holding 1 January) and Weekday (0 is Monday); done is the matching
+    days x habits boolean matrix.
+    """
+    __slots__ = ()
+
+    def values(self, habit=None):
+        """Returns days with a Value column: habit's 0/1, or habits done that day."""
+        if habit is None:
+            value = self.done.sum(axis=1)
+        else:
+            value = self.done[:, self.habits.index(habit)].astype(np.int64)
+        return self.days.assign(Value=value)
+
+
+@st.cache_resource
+def _tile_cache():
+    """Process-wide tiles, keyed by (storage location, year)."""
+    return {'lock': threading.Lock(), 'tiles': OrderedDict(), 'builds': 0, 'hits': 0}
+
+def _year_rows(df, year):
+    """Returns the habits, days and done matrix of one year's rows."""
+    rows = slice_days(df, pd.Timestamp(year, 1, 1), pd.Timestamp(year, 12, 31))
+    habits = [col for col in rows.columns if col != 'Date']
+    done = rows[habits].to_numpy()
+    if done.dtype != bool:
+        done = coerce_habit_columns(rows)[habits].to_numpy(dtype=bool)
+    return habits, rows['Date'].to_numpy().astype('datetime64[D]'), done
+
+def _fingerprint(habits, days, done):
+    """Returns a digest of a year's rows: its habits, dates and packed cells."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(days.tobytes())
+    digest.update(np.packbits(done).tobytes())
+    return tuple(habits), done.shape, digest.digest()
+
+def build_tile(year, habits, days, done):
+    """Lays out one year's rows; days without a row count as not done."""
+    calendar = pd.date_range(pd.Timestamp(year, 1, 1), pd.Timestamp(year, 12, 31), freq='D')
+    first_monday = calendar[0] - pd.Timedelta(days=calendar[0].weekday())
+    matrix = np.zeros((len(calendar), len(habits)), dtype=bool)
+    matrix[(days - np.datetime64(f'{year}-01-01', 'D')).astype(np.int64)] = done
+    layout = pd.DataFrame({'Date': calendar,
+                           'Week': (calendar - first_monday).days // 7,
+                           'Weekday': calendar.weekday})
+    return YearTile(year, tuple(habits), layout, matrix)
+
+def year_tile(location, df, year, version=None):
+    """Returns the tile for year, rebuilding it only if that year's rows changed.
+
+    version is the storage's year_version() for df. With it a cached tile is
+    found without touching the rows; without it (writes still queued) the
+    year's rows are sliced and hashed to tell whether they changed.
+    """
+    rows = None
+    if version is not None:
+        stamp = (tuple(df.columns), version)
+    else:
+        rows = _year_rows(df, year)
+        stamp = _fingerprint(*rows)
+    cache = _tile_cache()
+    key = (location, year)
+    with cache['lock']:
+        entry = cache['tiles'].get(key)
+        if entry is not None and entry[0] == stamp:
+            cache['tiles'].move_to_end(key)
+            cache['hits'] += 1
+            return entry[1]
+    if rows is None:
+        rows = _year_rows(df, year)
+    tile = build_tile(year, *rows)
+    with cache['lock']:
+        cache['tiles'][key] = (stamp, tile)
+        cache['tiles'].move_to_end(key)
+        cache['builds'] += 1
+        while len(cache['tiles']) > HEATMAP_MAX_TILES:
+            cache['tiles'].popitem(last=False)
+    return tile
+
+def tile_cache_stats():
+    cache = _tile_cache()
+    with cache['lock']:
+        return {'tiles': len(cache['tiles']), 'builds': cache['builds'],
+                'hits': cache['hits']}
+
+def years(df):
+    """Returns the years from the first recorded day to the last, newest first."""
+    if df.empty:
+        return []
+    return list(range(df['Date'].iat[-1].year, df['Date'].iat[0].year - 1, -1))
+
+def heatmap_chart(tile, habit=None, label="Habits done"):
+    """Returns the calendar chart for one habit, or for all of them."""
+    most = 1 if habit is not None else max(len(tile.habits), 1)
+    return alt.Chart(tile.values(habit)).mark_rect(cornerRadius=2).encode(
+        x=alt.X('Week:O', axis=None),
+        y=alt.Y('Weekday:O', title=None, axis=alt.Axis(
+            labelExpr=f"{list(WEEKDAY_LABELS)}[datum.value]", ticks=False, domain=False)),
+        color=alt.Color('Value:Q', title=label, legend=None,
+                        scale=alt.Scale(scheme='greens', domain=[0, most])),
+        tooltip=[alt.Tooltip('Date:T', format='%Y-%m-%d'), alt.Tooltip('Value:Q', title=label)],
+    ).properties(height=150)
@@ -0,0 +1,159 @@
+"""Opt-in per-phase timing of script reruns.
+
+With PHASE_TIMING enabled, every phase wrapped in phase() is timed into an
+in-process histogram. The histograms are shown in a debug panel (open the app
+with ?debug=1) and periodically dumped to METRICS_FILE, as JSON if its name
+ends in .json and as Prometheus text otherwise.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import streamlit as st
+
+from heatmap import tile_cache_stats
+from storage import habit_cache_stats, lock_wait_stats, write_behind_stats
+
+# Configuration
+PHASE_TIMING = False
+METRICS_FILE = 'habits_metrics.prom'
+# Rewrite METRICS_FILE at most this often, in seconds
+METRICS_DUMP_INTERVAL = 10.0
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+
+@st.cache_resource
+def _registry():
+    """Process-wide phase histograms, shared by all sessions."""
+    return {'lock': threading.Lock(), 'phases': {}, 'last_dump': 0.0}
+
+def record(name, ms):
+    """Adds one observation of a phase duration to its histogram."""
+    registry = _registry()
+    with registry['lock']:
+        hist = registry['phases'].setdefault(name, {
+            'buckets': [0] * len(BUCKETS_MS), 'count': 0, 'sum': 0.0,
+            'max': 0.0, 'last': 0.0})
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                hist['buckets'][i] += 1
+                break
+        hist['count'] += 1
+        hist['sum'] += ms
+        hist['max'] = max(hist['max'], ms)
+        hist['last'] = ms
+
+@contextmanager
+def _timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+def phase(name):
+    """Times the enclosed block as phase name; a no-op unless PHASE_TIMING."""
+    return _timed(name) if PHASE_TIMING else nullcontext()
+
+def snapshot():
+    """Returns a copy of every phase histogram."""
+    registry = _registry()
+    with registry['lock']:
+        return {name: {**hist, 'buckets': list(hist['buckets'])}
+                for name, hist in registry['phases'].items()}
+
+def _quantile(hist, q):
+    """Estimates a quantile as the upper bound of the bucket that holds it."""
+    target, seen = q * hist['count'], 0
+    for bound, count in zip(BUCKETS_MS, hist['buckets']):
+        seen += count
+        if seen >= target:
+            return min(bound, hist['max'])
+    return hist['max']
+
+def to_prometheus(phases):
+    lines = ['# HELP habits_phase_duration_ms Duration of each script rerun phase.',
+             '# TYPE habits_phase_duration_ms histogram']
+    for name, hist in sorted(phases.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS, hist['buckets']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            lines.append(f'habits_phase_duration_ms_bucket{{phase="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'habits_phase_duration_ms_sum{{phase="{name}"}} {hist["sum"]:.3f}')
+        lines.append(f'habits_phase_duration_ms_count{{phase="{name}"}} {hist["count"]}')
+    cache, locks, writes = habit_cache_stats(), lock_wait_stats(), write_behind_stats()
+    lines += ['# TYPE habits_cache_hits_total counter',
+              f'habits_cache_hits_total {cache["hits"]}',
+              '# TYPE habits_cache_misses_total counter',
+              f'habits_cache_misses_total {cache["misses"]}',
+              '# TYPE habits_cache_evictions_total counter',
+              f'habits_cache_evictions_total {cache["evictions"]}',
+              '# TYPE habits_cache_resident_bytes gauge',
+              f'habits_cache_resident_bytes {cache["resident_bytes"]}',
+              '# TYPE habits_cache_sessions gauge',
+              f'habits_cache_sessions {cache["sessions"]}',
+              '# TYPE habits_lock_wait_seconds_total counter',
+              f'habits_lock_wait_seconds_total {locks["total_wait"]:.6f}',
+              '# TYPE habits_lock_acquisitions_total counter',
+              f'habits_lock_acquisitions_total {locks["acquisitions"]}',
+              '# TYPE habits_write_queue_depth gauge',
+              f'habits_write_queue_depth {writes["queue_depth"]}',
+              '# TYPE habits_write_behind_flushes_total counter',
+              f'habits_write_behind_flushes_total {writes["flushes"]}',
+              '# TYPE habits_write_behind_errors_total counter',
+              f'habits_write_behind_errors_total {writes["errors"]}']
+    return '\n'.join(lines) + '\n'
+
+def dump_metrics(path=METRICS_FILE):
+    """Writes the current histograms to path as JSON or Prometheus text."""
+    phases = snapshot()
+    if path.endswith('.json'):
+        text = json.dumps({'phases': phases, 'buckets_ms': [str(b) for b in BUCKETS_MS],
+                           'cache': habit_cache_stats(), 'locks': lock_wait_stats(),
+                           'write_behind': write_behind_stats()},
+                          indent=2)
+    else:
+        text = to_prometheus(phases)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def start_rerun():
+    """Returns the start time to pass to finish_rerun()."""
+    return time.perf_counter()
+
+def finish_rerun(start):
+    """Records the whole rerun and dumps METRICS_FILE if it is due."""
+    if not PHASE_TIMING:
+        return
+    record('rerun', (time.perf_counter() - start) * 1000)
+    registry = _registry()
+    with registry['lock']:
+        now = time.monotonic()
+        due = now - registry['last_dump'] >= METRICS_DUMP_INTERVAL
+        if due:
+            registry['last_dump'] = now
+    if due:
+        try:
+            dump_metrics()
+        except OSError as e:
+            st.warning(f"Could not write metrics file: {e}")
+
+def render_debug_panel():
+    """Shows the phase histograms when the page is opened with ?debug=1."""
+    if not PHASE_TIMING or st.query_params.get('debug') != '1':
+        return
+    with st.expander("Debug: phase timings"):
+        rows = [{'Phase': name, 'Count': hist['count'],
+                 'Mean (ms)': hist['sum'] / hist['count'],
+                 'p50 (ms)': _quantile(hist, 0.5), 'p95 (ms)': _quantile(hist, 0.95),
+                 'Max (ms)': hist['max'], 'Last (ms)': hist['last']}
+                for name, hist in sorted(snapshot().items())]
+        st.dataframe(rows, hide_index=True)
+        st.caption(f"Cache {habit_cache_stats()} · lock waits {lock_wait_stats()} · "
+                   f"write-behind {write_behind_stats()} · heatmap tiles {tile_cache_stats()}")
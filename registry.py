@@ -0,0 +1,169 @@
+"""Habit registry: names, order, schedules and archiving, kept apart from the data.
+
+Every habit has a stable integer id and the data column it is stored under.
+The column never changes once assigned, so renaming, reordering, archiving
+or rescheduling a habit is a one-row update here and never touches history.
+"""
+import sqlite3
+from collections import namedtuple
+from contextlib import closing
+from datetime import date
+
+import pandas as pd
+
+# Configuration
+HABITS_REGISTRY_FILE = 'habits.registry.db'
+# Weekday abbreviations accepted in a schedule, in strftime('%a') form
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+# Column names of the habit frame that are not habits
+RESERVED_NAMES = ('Date',)
+
+
+def check_name(name):
+    """Returns name stripped of surrounding space; raises ValueError if unusable."""
+    text = str(name).strip() if name is not None else ''
+    if not text:
+        raise ValueError("Habit name cannot be empty.")
+    if text in RESERVED_NAMES:
+        raise ValueError(f"'{text}' is reserved and cannot be a habit name.")
+    return text
+
+
+def parse_schedule(schedule):
+    """Normalizes 'daily' or a comma-separated list of weekdays.
+
+    Raises ValueError for anything else.
+    """
+    text = str(schedule).strip()
+    if text.lower() in ('', 'daily'):
+        return 'daily'
+    days = [day.strip().title()[:3] for day in text.split(',') if day.strip()]
+    unknown = [day for day in days if day not in WEEKDAYS]
+    if unknown:
+        raise ValueError(f"Unknown weekday(s) in schedule: {', '.join(unknown)}")
+    return ','.join(day for day in WEEKDAYS if day in days)
+
+
+class Habit(namedtuple('Habit', 'id name column created archived schedule position')):
+    __slots__ = ()
+
+    def due(self, day):
+        """True if the schedule asks for this habit on day."""
+        return (self.schedule == 'daily'
+                or pd.Timestamp(day).strftime('%a') in self.schedule.split(','))
+
+
+class HabitRegistry:
+    """Habit metadata in SQLite, one row per habit."""
+
+    def __init__(self, path=HABITS_REGISTRY_FILE):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS habits (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                data_column TEXT NOT NULL UNIQUE,
+                created TEXT NOT NULL,
+                archived INTEGER NOT NULL DEFAULT 0,
+                schedule TEXT NOT NULL DEFAULT 'daily',
+                position INTEGER NOT NULL
+            );
+        """)
+        return conn
+
+    def habits(self, include_archived=False):
+        """Returns the habits in display order."""
+        query = ('SELECT id, name, data_column, created, archived, schedule, position '
+                 'FROM habits')
+        if not include_archived:
+            query += ' WHERE archived = 0'
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query + ' ORDER BY position, id').fetchall()
+        return [Habit(id_, name, column, date.fromisoformat(created), bool(archived),
+                      schedule, position)
+                for id_, name, column, created, archived, schedule, position in rows]
+
+    def find(self, name):
+        """Returns the habit called name, archived or not, or None."""
+        return next((habit for habit in self.habits(include_archived=True)
+                     if habit.name == name), None)
+
+    def archived_columns(self):
+        with closing(self._connect()) as conn:
+            return {row[0] for row in
+                    conn.execute('SELECT data_column FROM habits WHERE archived = 1')}
+
+    def _insert(self, conn, name, column, created):
+        """Inserts a habit, suffixing its name or column with its id if taken."""
+        habit_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM habits').fetchone()[0]
+        if conn.execute('SELECT 1 FROM habits WHERE name = ?', (name,)).fetchone():
+            name = f"{name} #{habit_id}"
+        if conn.execute('SELECT 1 FROM habits WHERE data_column = ?', (column,)).fetchone():
+            column = f"{column} #{habit_id}"
+        conn.execute(
+            'INSERT INTO habits (id, name, data_column, created, position) '
+            'SELECT ?, ?, ?, ?, COALESCE(MAX(position) + 1, 0) FROM habits',
+            (habit_id, name, column, created.isoformat()))
+        return habit_id
+
+    def sync(self, columns, created=None):
+        """Registers the data columns the registry does not know yet.
+
+        This is how the habits of data created before the registry, or
+        columns added by hand, get an id.
+        """
+        created = created or date.today()
+        with closing(self._connect()) as conn, conn:
+            known = {row[0] for row in conn.execute('SELECT data_column FROM habits')}
+            if all(column in known for column in columns):
+                return  # The common case, without taking the write lock
+            conn.execute('BEGIN IMMEDIATE')
+            known = {row[0] for row in conn.execute('SELECT data_column FROM habits')}
+            for column in columns:
+                if column not in known and column not in RESERVED_NAMES:
+                    self._insert(conn, column, column, created)
+
+    def add(self, name, created=None):
+        """Registers a new habit and returns it.
+
+        Its data column is the name, unless an earlier habit (since renamed)
+        already stores its data under that name; then the id is appended.
+        Raises ValueError for an empty or reserved name.
+        """
+        name = check_name(name)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            habit_id = self._insert(conn, name, name, created or date.today())
+        return next(habit for habit in self.habits(include_archived=True)
+                    if habit.id == habit_id)
+
+    def update(self, habit_id, **fields):
+        """Changes any of name, archived, schedule and position of one habit."""
+        allowed = {'name', 'archived', 'schedule', 'position'}
+        if set(fields) - allowed:
+            raise ValueError(f"Cannot update {', '.join(sorted(set(fields) - allowed))}")
+        if 'name' in fields:
+            fields['name'] = check_name(fields['name'])
+        if 'schedule' in fields:
+            fields['schedule'] = parse_schedule(fields['schedule'])
+        if 'archived' in fields:
+            fields['archived'] = int(bool(fields['archived']))
+        if not fields:
+            return
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f'UPDATE habits SET {assignments} WHERE id = ?',
+                         (*fields.values(), habit_id))
+
+    def frame(self):
+        """Returns every habit as an editable frame indexed by id."""
+        habits = self.habits(include_archived=True)
+        return pd.DataFrame({
+            'Name': [habit.name for habit in habits],
+            'Schedule': [habit.schedule for habit in habits],
+            'Archived': [habit.archived for habit in habits],
+            'Position': [habit.position for habit in habits],
+        }, index=pd.Index([habit.id for habit in habits], name='id'))
@@ -0,0 +1,168 @@
+"""Vectorized statistics over the wide habit frame."""
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datetime import date
+
+from registry import WEEKDAYS
+from storage import coerce_habit_columns
+
+# Configuration
+# Trailing windows, in days, of the rolling completion rates
+ROLLING_WINDOWS = (7, 30, 90)
+# Results kept by rolling_stats(), one per data version and day
+ROLLING_CACHE_ENTRIES = 32
+
+
+def _dense_matrix(df, today=None):
+    """Returns (habits, first_day, matrix) with one row per calendar day.
+
+    Days that have no row in df count as not completed, so they break
+    streaks. The span always reaches today so a lapsed streak reads as 0.
+    """
+    habits = [col for col in df.columns if col != 'Date']
+    today = np.datetime64(today or date.today(), 'D')
+    if df.empty or not habits:
+        return habits, today, np.zeros((0, len(habits)), dtype=bool)
+    if not (df.dtypes.drop('Date') == bool).all():
+        df = coerce_habit_columns(df)
+    dates = df['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    days = dates.to_numpy().astype('datetime64[D]')
+    first_day = days.min()
+    n_days = int((max(days.max(), today) - first_day).astype(np.int64)) + 1
+    matrix = np.zeros((n_days, len(habits)), dtype=bool)
+    matrix[(days - first_day).astype(np.int64)] = df[habits].to_numpy(dtype=bool)
+    return habits, first_day, matrix
+
+def _run_lengths(matrix):
+    """Run-length encodes the True runs of every column at once.
+
+    Returns (column, start, length) arrays ordered by column, then start.
+    """
+    n_days, n_habits = matrix.shape
+    padded = np.zeros((n_habits, n_days + 2), dtype=np.int8)
+    padded[:, 1:-1] = matrix.T
+    edges = np.diff(padded, axis=1)
+    # Every +1 edge has a matching -1 edge later in the same row, and the
+    # flat indices walk rows in order, so the two lists pair up one to one
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    column, start = np.divmod(starts, edges.shape[1])
+    return column, start, ends - starts
+
+def streak_runs(df):
+    """Returns every streak as a row of (Habit, Start, End, Length)."""
+    habits, first_day, matrix = _dense_matrix(df)
+    column, start, length = _run_lengths(matrix)
+    starts = first_day + start.astype('timedelta64[D]')
+    return pd.DataFrame({
+        'Habit': np.array(habits, dtype=object)[column],
+        'Start': pd.to_datetime(starts),
+        'End': pd.to_datetime(starts + (length - 1).astype('timedelta64[D]')),
+        'Length': length,
+    })
+
+def _cumulative(matrix):
+    """Returns the running totals of every column, with a leading row of zeros.
+
+    The number of completions in days [i, j) is then totals[j] - totals[i],
+    so any trailing window is one subtraction however long it is.
+    """
+    totals = np.zeros((len(matrix) + 1, matrix.shape[1]), dtype=np.int64)
+    np.cumsum(matrix, axis=0, out=totals[1:])
+    return totals
+
+def _due_matrix(habits, first_day, n_days, schedules):
+    """Returns which habit is due on which day, or None if all are daily.
+
+    schedules maps habits to registry schedules ('daily' or 'Mon,Wed,...');
+    habits missing from it are daily.
+    """
+    if all(schedules.get(habit, 'daily') == 'daily' for habit in habits):
+        return None
+    # 1970-01-01, day 0 of datetime64, was a Thursday
+    weekdays = (np.arange(n_days) + first_day.astype(np.int64) + 3) % 7
+    due = np.ones((n_days, len(habits)), dtype=bool)
+    for i, habit in enumerate(habits):
+        schedule = schedules.get(habit, 'daily')
+        if schedule != 'daily':
+            due[:, i] = np.isin(weekdays, [WEEKDAYS.index(day) for day in schedule.split(',')])
+    return due
+
+def _ratio(done, due):
+    """Returns done / due, with 0 where nothing was due."""
+    done, due = np.asarray(done, dtype=float), np.asarray(due, dtype=float)
+    return np.divide(done, due, out=np.zeros_like(done), where=due > 0)
+
+def _window_sums(totals, window, end=None):
+    """Returns the completions in the window ending on each day in end.
+
+    end holds day numbers counted from 1 (default: every day); windows that
+    would start before the first day are cut short, and the returned spans
+    give their real length.
+    """
+    if end is None:
+        end = np.arange(1, len(totals))
+    start = np.maximum(end - window, 0)
+    return totals[end] - totals[start], end - start
+
+def _current_rates(habits, totals, due_totals, windows):
+    last = np.array([len(totals) - 1])
+    rates = {}
+    for window in windows:
+        sums, span = _window_sums(totals, window, last)
+        if due_totals is None:
+            due = np.repeat(span, len(habits))
+        else:
+            due = _window_sums(due_totals, window, last)[0][0]
+        rates[f'{window} days'] = _ratio(sums[0], due)
+    return pd.DataFrame(rates, index=pd.Index(habits, name='Habit'))
+
+def _rolling_stats(df, today, windows, schedules):
+    habits, first_day, matrix = _dense_matrix(df, today)
+    due = _due_matrix(habits, first_day, len(matrix), schedules)
+    if due is not None:
+        # Days a habit is not scheduled on count neither way
+        matrix = matrix & due
+    totals = _cumulative(matrix)
+    due_totals = None if due is None else _cumulative(due)
+    # The mean rate of all habits only needs the totals per day
+    all_totals = totals.sum(axis=1, keepdims=True)
+    all_due = None if due is None else due_totals.sum(axis=1, keepdims=True)
+    overall = {}
+    for window in windows:
+        sums, span = _window_sums(all_totals, window)
+        if all_due is None:
+            possible = span * max(len(habits), 1)
+        else:
+            possible = _window_sums(all_due, window)[0][:, 0]
+        overall[f'{window} days'] = _ratio(sums[:, 0], possible)
+    days = first_day + np.arange(len(matrix)).astype('timedelta64[D]')
+    return (_current_rates(habits, totals, due_totals, windows),
+            pd.DataFrame(overall, index=pd.DatetimeIndex(days, name='Date')))
+
+@st.cache_data(max_entries=ROLLING_CACHE_ENTRIES, show_spinner=False)
+def _cached_rolling_stats(token, today, windows, schedules, _df):
+    # _df is not hashed; token stands in for its contents
+    return _rolling_stats(_df, today, windows, dict(schedules))
+
+def rolling_stats(df, token=None, today=None, windows=ROLLING_WINDOWS, schedules=None):
+    """Returns (current rates, overall rate history) for the page.
+
+    The current rates are each habit's completion rate over the windows
+    ending today; days missing from df count as not done, and a window
+    longer than the history is measured over the days that exist. The
+    overall history has a column per window with the rate of all habits
+    together on each day. schedules maps habits to registry schedules; only
+    the days a habit is scheduled on count towards its rate, and habits
+    without one are daily. Results are cached between reruns under token, a
+    HabitStorage.data_token(); without one they are always recomputed.
+    """
+    today = today or date.today()
+    schedules = schedules or {}
+    if token is None:
+        return _rolling_stats(df, today, windows, schedules)
+    return _cached_rolling_stats(token, today, tuple(windows),
+                                 tuple(sorted(schedules.items())), df)
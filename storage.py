@@ -0,0 +1,1513 @@
+"""Persistence for habit data: CSV, SQLite, columnar and sparse event backends.
+
+Run as a script to convert an existing habits CSV to the columnar format.
+"""
+import streamlit as st
+import pandas as pd
+import os
+import csv
+import time
+import hashlib
+import atexit
+import logging
+import shutil
+import sqlite3
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import closing, contextmanager, nullcontext
+from datetime import date
+
+from bitset import HabitBitset
+from events import HabitEvents
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed by the columnar backend
+    feather = pq = None
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# Configuration
+HABITS_FILE = 'habits.csv'
+# 'changelog' appends each checkbox toggle to HABITS_LOG_FILE, 'rewrite'
+# saves the whole CSV on every change
+PERSISTENCE_MODE = 'changelog'
+HABITS_LOG_FILE = 'habits.log.csv'
+# Fold the change log back into HABITS_FILE once it holds this many entries
+CHANGE_LOG_COMPACT_THRESHOLD = 500
+# The change log doubles as a write-ahead log: 'always' fsyncs every toggle,
+# 'batch' fsyncs at most once per WAL_FSYNC_INTERVAL seconds, 'off' leaves
+# flushing to the OS
+WAL_SYNC_MODE = 'batch'
+WAL_FSYNC_INTERVAL = 1.0
+# 'csv' keeps the wide table in HABITS_FILE, 'sqlite' stores one row per
+# (date, habit) cell in HABITS_DB_FILE, 'events' only stores the completed
+# (date, habit) pairs in HABITS_EVENTS_FILE
+STORAGE_BACKEND = 'csv'
+HABITS_DB_FILE = 'habits.db'
+HABITS_EVENTS_FILE = 'habits.events.db'
+# Used by the 'columnar' backend: a .parquet file, or a .arrow file for
+# uncompressed Arrow IPC that is memory-mapped on load
+HABITS_COLUMNAR_FILE = 'habits.parquet'
+# Used by the 'bitset' backend: packed one-bit-per-day arrays
+HABITS_BITSET_FILE = 'habits.bits.npz'
+# Taken shared by readers and exclusive by writers, across processes
+HABITS_LOCK_FILE = 'habits.lock'
+# Queue saves for a background writer thread instead of writing in the
+# request path; it coalesces everything queued within WRITE_BEHIND_INTERVAL
+# seconds into one write, and the queue is flushed at exit
+WRITE_BEHIND = False
+WRITE_BEHIND_INTERVAL = 0.5
+# Per-user shards (see get_storage) each hold their own copy of the files
+# above under USER_DATA_DIR, so users never share a file, lock or cache entry
+USER_DATA_DIR = 'users'
+
+# ensure_today_exists adds every day missing up to today, not just today,
+# in one reindex. Days with nothing done are then only stored with
+# MISSING_DAYS_STORAGE = 'dense'; 'sparse' leaves them out of the files, as
+# a missing day already reads as not done
+FILL_MISSING_DAYS = True
+MISSING_DAYS_STORAGE = 'sparse'
+
+# Memory budget of the process-wide habit data cache, in bytes
+HABIT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Dates are datetime64 in memory and only rendered as text in the files
+DATE_FORMAT = '%Y-%m-%d'
+
+# Copy-on-write is always on from pandas 3 and opt-in before
+_COPY_ON_WRITE = (int(pd.__version__.split('.')[0]) >= 3
+                  or pd.options.mode.copy_on_write is True)
+
+# --- Caching ---
+@st.cache_resource
+def _habit_data_cache():
+    """Process-wide LRU cache of parsed habit data, shared by all sessions.
+
+    entries maps a data file's absolute path to its signature, data and size,
+    least recently used first. Backends that cache something other than a
+    frame keep the frame built from it as a separate entry (see _view_path),
+    so both count against the budget and the view can be evicted on its own.
+    refs counts the sessions currently working on each path; those entries
+    are only evicted if nothing else is left.
+    """
+    return {'entries': OrderedDict(), 'refs': {}, 'bytes': 0,
+            'hits': 0, 'misses': 0, 'evictions': 0, 'lock': threading.Lock()}
+
+def _file_signature(path):
+    """Returns the (mtime, size) pair used to detect changes to a data file."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _nbytes(data):
+    """Returns the memory held by a cached frame or HabitBitset."""
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum())
+    return data.nbytes
+
+def _share(data):
+    """Returns a copy of cached data that the caller may modify in place.
+
+    Under pandas copy-on-write a shallow copy shares the cached columns until
+    one is written to, so sessions reading the same data share its memory.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data.copy(deep=not _COPY_ON_WRITE)
+    return data.copy()
+
+def habit_cache_stats():
+    """Returns the cache counters, resident size and eviction count."""
+    cache = _habit_data_cache()
+    with cache['lock']:
+        return {'hits': cache['hits'], 'misses': cache['misses'],
+                'evictions': cache['evictions'], 'entries': len(cache['entries']),
+                'resident_bytes': cache['bytes'], 'max_bytes': HABIT_CACHE_MAX_BYTES,
+                'sessions': sum(cache['refs'].values())}
+
+def _drop_entry(cache, key):
+    entry = cache['entries'].pop(key, None)
+    if entry is not None:
+        cache['bytes'] -= entry[2]
+
+def _view_path(path, view='frame'):
+    """Returns the cache key of a frame derived from the data cached for path.
+
+    'frame' is the wide frame of a backend that caches something else, and
+    'filled' the frame ensure_today_exists() filled the gaps of.
+    """
+    return f'{path}#{view}'
+
+def invalidate_habit_cache(path=HABITS_FILE):
+    """Drops the cached copy of a data file so the next load re-reads it."""
+    cache = _habit_data_cache()
+    with cache['lock']:
+        for key in (path, _view_path(path), _view_path(path, 'filled')):
+            _drop_entry(cache, os.path.abspath(key))
+
+def _cache_lookup(path, signature):
+    """Returns a copy of the cached data for path if its signature still matches."""
+    cache = _habit_data_cache()
+    key = os.path.abspath(path)
+    with cache['lock']:
+        entry = cache['entries'].get(key)
+        if entry is not None and entry[0] == signature:
+            cache['hits'] += 1
+            cache['entries'].move_to_end(key)
+            # Callers modify the frame in place, so hand out a copy
+            return _share(entry[1])
+        cache['misses'] += 1
+    return None
+
+def _cache_store(path, signature, df):
+    """Caches freshly parsed data, evicts down to the budget, returns a copy."""
+    cache = _habit_data_cache()
+    key = os.path.abspath(path)
+    size = _nbytes(df)
+    with cache['lock']:
+        _drop_entry(cache, key)
+        cache['entries'][key] = (signature, df, size)
+        cache['bytes'] += size
+        # Least recently used first, skipping data a session is working on
+        # (and the entry just stored) unless nothing else is left to evict
+        for pinned in (False, True):
+            for victim in list(cache['entries']):
+                if cache['bytes'] <= HABIT_CACHE_MAX_BYTES:
+                    break
+                if victim == key or (cache['refs'].get(victim) and not pinned):
+                    continue
+                _drop_entry(cache, victim)
+                cache['evictions'] += 1
+    return _share(df)
+
+def _cache_update(path, old_signature, new_signature, update):
+    """Patches the cached data for path after a write of our own.
+
+    The entry is replaced by update(data) and stamped with new_signature,
+    but only if it still describes the data as of old_signature, the
+    version just before the write; otherwise it is dropped.
+    """
+    cache = _habit_data_cache()
+    key = os.path.abspath(path)
+    with cache['lock']:
+        # A frame built from the old data is rebuilt on the next load
+        _drop_entry(cache, os.path.abspath(_view_path(path)))
+        entry = cache['entries'].get(key)
+        if entry is None or entry[0] != old_signature:
+            _drop_entry(cache, key)
+            return
+        data = update(entry[1])
+        size = _nbytes(data)
+        cache['bytes'] += size - entry[2]
+        cache['entries'][key] = (new_signature, data, size)
+
+def _release_session_ref(key):
+    cache = _habit_data_cache()
+    with cache['lock']:
+        cache['refs'][key] -= 1
+        if not cache['refs'][key]:
+            del cache['refs'][key]
+
+class _SessionRef:
+    """Marks one session as using a cached path until it switches or ends.
+
+    Stored in session state, so the reference is released when Streamlit
+    drops the session and this object is garbage collected.
+    """
+
+    def __init__(self, path):
+        self.key = os.path.abspath(path)
+        cache = _habit_data_cache()
+        with cache['lock']:
+            cache['refs'][self.key] = cache['refs'].get(self.key, 0) + 1
+        self.release = weakref.finalize(self, _release_session_ref, self.key)
+
+def _attach_session(path):
+    """Counts the current session as a user of path's cache entry."""
+    ref = st.session_state.get('_habit_cache_ref')
+    if ref is not None and ref.key == os.path.abspath(path):
+        return
+    if ref is not None:
+        ref.release()
+    st.session_state['_habit_cache_ref'] = _SessionRef(path)
+
+# --- Durable Writes ---
+def _fsync_directory(directory):
+    """Persists a rename by syncing its directory, where the OS supports it."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _atomic_write(path, write):
+    """Writes a file through a temporary sibling and an atomic rename.
+
+    write(f) receives a binary file object. Readers, and a crash at any point,
+    see either the old file or the complete new one, never a partial write.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(directory)
+
+@st.cache_resource
+def _change_log_sync_state():
+    """Process-wide fsync bookkeeping for the change log."""
+    state = {'lock': threading.Lock(), 'last_sync': 0.0, 'timer': None, 'dirty': set()}
+    atexit.register(_sync_change_log_now, state)
+    return state
+
+def _sync_change_log_now(state):
+    """Fsyncs every change log with deferred writes and cancels the timer."""
+    with state['lock']:
+        if state['timer'] is not None:
+            state['timer'].cancel()
+            state['timer'] = None
+        for log_path in state['dirty']:
+            try:
+                fd = os.open(log_path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # Compacted in the meantime; nothing left to sync
+            try:
+                # fsync flushes the file itself, whichever descriptor is used
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        state['dirty'].clear()
+        state['last_sync'] = time.monotonic()
+
+def _sync_change_log(f):
+    """Applies WAL_SYNC_MODE after appending to the change log through f."""
+    if WAL_SYNC_MODE == 'always':
+        os.fsync(f.fileno())
+    elif WAL_SYNC_MODE == 'batch':
+        state = _change_log_sync_state()
+        with state['lock']:
+            wait = state['last_sync'] + WAL_FSYNC_INTERVAL - time.monotonic()
+            if wait <= 0:
+                os.fsync(f.fileno())
+                state['last_sync'] = time.monotonic()
+                return
+            state['dirty'].add(f.name)
+            if state['timer'] is None:
+                # Group every toggle in this window into one deferred fsync
+                timer = threading.Timer(wait, _sync_change_log_now, args=(state,))
+                timer.daemon = True
+                state['timer'] = timer
+                timer.start()
+
+
+# --- CSV Storage ---
+def _read_habits_file(path=HABITS_FILE, exclude=frozenset()):
+    """Loads habit data from CSV; a missing file reads as no data.
+
+    The habit columns named in exclude are not parsed at all. Nothing is
+    written here: readers only hold the shared lock, and the first save
+    creates the file.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['Date'])
+    else:
+        # Reuse the parsed frame while the file is unchanged on disk
+        signature = (_file_signature(path), exclude)
+        cached = _cache_lookup(path, signature)
+        if cached is not None:
+            return cached
+        try:
+            df = pd.read_csv(path, parse_dates=['Date'], date_format=DATE_FORMAT,
+                             usecols=(lambda col: col not in exclude) if exclude else None)
+        except pd.errors.EmptyDataError:
+            # Handle case where file exists but is empty
+            return pd.DataFrame(columns=['Date'])
+        except Exception as e:
+            st.error(f"Error loading habit data: {e}")
+            # Return an empty DataFrame on error to prevent app crash
+            return pd.DataFrame(columns=['Date'])
+        return _cache_store(path, signature, df)
+
+def _replay_change_log(df, log_path=HABITS_LOG_FILE, exclude=frozenset()):
+    """Applies the cell changes recorded in the change log to a loaded frame.
+
+    Entries for the habits in exclude are skipped. Returns the updated frame
+    and the number of log entries that were read.
+    """
+    if not os.path.exists(log_path):
+        return df, 0
+    try:
+        log = pd.read_csv(log_path, names=['Date', 'Habit', 'Value'],
+                          dtype=str, on_bad_lines='skip')
+    except pd.errors.EmptyDataError:
+        return df, 0
+    except Exception as e:
+        st.error(f"Error reading habit change log: {e}")
+        return df, 0
+    entries = len(log)
+    # A crash mid-append can leave a torn last line; ignore anything malformed
+    log['Date'] = pd.to_datetime(log['Date'], format=DATE_FORMAT, errors='coerce')
+    log = log[log['Value'].isin(['True', 'False']) & log['Date'].notna()
+              & ~log['Habit'].isin(exclude)]
+    log['Value'] = log['Value'] == 'True'
+    return _apply_cell_changes(df, log), entries
+
+def _apply_cell_changes(df, changes):
+    """Sets the cells listed in a (Date, Habit, Value) frame, in order.
+
+    Habits and dates that df does not have yet are added, defaulting to False.
+    """
+    # Each entry sets an absolute value, so only the latest one per cell counts
+    log = changes.drop_duplicates(['Date', 'Habit'], keep='last')
+
+    for habit in log['Habit'].unique():
+        if habit not in df.columns:
+            df[habit] = False
+        elif not pd.api.types.is_bool_dtype(df[habit]):
+            # Hand-edited columns may have been parsed as numbers or strings
+            df[habit] = _as_bool(df[habit])
+    new_dates = log.loc[~log['Date'].isin(df['Date']), 'Date'].unique()
+    if len(new_dates):
+        new_rows = pd.DataFrame({'Date': new_dates})
+        for col in df.columns:
+            if col != 'Date':
+                new_rows[col] = False
+        df = pd.concat([df, new_rows], ignore_index=True)
+        # An empty base frame leaves Date as object dtype after the concat
+        df['Date'] = pd.to_datetime(df['Date'])
+
+    row_of = dict(zip(df['Date'], df.index))
+    for entry in log.itertuples(index=False):
+        df.at[row_of[entry.Date], entry.Habit] = bool(entry.Value)
+    return df
+
+def load_habit_data(path=HABITS_FILE, log_path=HABITS_LOG_FILE):
+    """Loads habit data from CSV and replays any pending logged changes.
+
+    This only reads; HabitStorage.load() compacts a long log afterwards,
+    under the exclusive lock.
+    """
+    return _replay_change_log(_read_habits_file(path), log_path)[0]
+
+def append_habit_changes(day, changes, log_path=HABITS_LOG_FILE):
+    """Records {habit: value} changes for one date in the change log.
+
+    Only the changed cells are written, with a single sync, so the cost of a
+    toggle does not depend on how much history HABITS_FILE holds.
+    """
+    with open(log_path, 'a', newline='') as f:
+        key = day_key(day)
+        csv.writer(f, lineterminator='\n').writerows(
+            [key, habit, bool(value)] for habit, value in changes.items())
+        f.flush()
+        _sync_change_log(f)
+
+
+def _clear_change_log(log_path=HABITS_LOG_FILE):
+    """Removes the change log once its entries have been written out in full."""
+    if os.path.exists(log_path):
+        os.remove(log_path)
+
+def save_habit_data(df, path=HABITS_FILE, log_path=HABITS_LOG_FILE):
+    """Saves habit data to CSV."""
+    df = stored_rows(df)
+    try:
+        _atomic_write(path, lambda f: df.to_csv(f, index=False))
+        # Every logged change is now part of the CSV
+        _clear_change_log(log_path)
+    finally:
+        # The mtime may not change within the filesystem's timestamp
+        # resolution, so never rely on it alone after our own writes
+        invalidate_habit_cache(path)
+
+
+# --- Columnar Storage ---
+def _as_bool(values):
+    """Interprets a hand-edited habit column ('True', 1, 'yes', ...) as booleans."""
+    text = values.astype(str).str.strip().str.lower()
+    return text.isin(['true', '1', '1.0', 'yes'])
+
+def coerce_habit_columns(df):
+    """Returns a copy with a datetime Date column and strictly boolean habits.
+
+    Manual CSV edits can leave habit columns as objects holding strings such
+    as 'True' or '0'; a columnar file stores them with a proper bool type.
+    """
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    for col in df.columns:
+        if col != 'Date' and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = _as_bool(df[col])
+    return df
+
+def _write_columnar(df, path):
+    """Writes a habit frame to a Parquet or Arrow IPC file."""
+    if feather is None:
+        raise ImportError("The columnar format requires pyarrow")
+    df = stored_rows(coerce_habit_columns(df)).reset_index(drop=True)
+    if path.endswith('.parquet'):
+        _atomic_write(path, lambda f: df.to_parquet(f, index=False))
+    else:
+        # Compressed buffers would have to be decoded, defeating memory-mapping
+        _atomic_write(path, lambda f: feather.write_feather(df, f, compression='uncompressed'))
+
+def _read_columnar(path, exclude=frozenset()):
+    """Loads a habit frame from a Parquet or Arrow IPC file.
+
+    The habit columns named in exclude are never converted to pandas.
+    """
+    if feather is None:
+        raise ImportError("The columnar format requires pyarrow")
+    if path.endswith('.parquet'):
+        table = pq.read_table(path, columns=[name for name in pq.read_schema(path).names
+                                             if name not in exclude])
+    else:
+        table = feather.read_table(path, memory_map=True)
+        table = table.select([name for name in table.column_names if name not in exclude])
+    return table.to_pandas()
+
+def convert_csv_to_columnar(csv_path=HABITS_FILE, dest=HABITS_COLUMNAR_FILE, log_path=None):
+    """One-shot conversion of a habits CSV (plus pending changes) to a columnar file.
+
+    log_path defaults to HABITS_LOG_FILE when converting HABITS_FILE itself.
+    """
+    df = coerce_habit_columns(pd.read_csv(csv_path, parse_dates=['Date']))
+    if log_path is None and csv_path == HABITS_FILE:
+        log_path = HABITS_LOG_FILE
+    if log_path:
+        df, _ = _replay_change_log(df, log_path)
+    _write_columnar(df, dest)
+    return dest
+
+
+# --- Frame Helpers ---
+def day_key(day):
+    """Renders a date as the text stored in the change log and SQLite."""
+    return pd.Timestamp(day).strftime(DATE_FORMAT)
+
+def normalize_frame(df):
+    """Returns df with a datetime64 Date column sorted ascending.
+
+    Every loaded frame has this shape so days can be found by binary search
+    instead of comparing strings row by row.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        df['Date'] = pd.to_datetime(df['Date'])
+    if not df['Date'].is_monotonic_increasing:
+        df = df.sort_values('Date', kind='stable', ignore_index=True)
+    return df
+
+def find_day(df, day):
+    """Returns the index label of day's row in a normalized frame, or None."""
+    dates = df['Date']
+    pos = dates.searchsorted(day)
+    if pos < len(dates) and dates.iat[pos] == day:
+        return df.index[pos]
+    return None
+
+def _set_day_values(df, day, changes):
+    """Sets one day's {habit: value} cells in a normalized frame, in place.
+
+    The day's row and any new habit columns are added, as not done, if
+    missing. Returns the frame, which is a new one if a row was added.
+    """
+    for habit in changes:
+        if habit not in df.columns:
+            df[habit] = False
+    day = pd.Timestamp(day)
+    row = find_day(df, day)
+    if row is None:
+        new_row = pd.DataFrame({col: [day if col == 'Date' else False] for col in df.columns})
+        df = normalize_frame(pd.concat([df, new_row], ignore_index=True))
+        row = find_day(df, day)
+    for habit, value in changes.items():
+        df.at[row, habit] = bool(value)
+    return df
+
+def slice_days(df, start, end):
+    """Returns the rows of a normalized frame dated start..end inclusive."""
+    dates = df['Date']
+    lo = dates.searchsorted(start, side='left')
+    hi = dates.searchsorted(end, side='right')
+    return df.iloc[lo:hi]
+
+def fill_missing_days(df, end=None):
+    """Returns a normalized frame with a row for every day up to end (today).
+
+    The days missing between the first stored day and end are added, as not
+    done, by a single reindex rather than a row at a time.
+    """
+    end = pd.Timestamp(end or date.today())
+    dates = df['Date']
+    first = min(dates.iat[0], end) if len(dates) else end
+    last = max(dates.iat[-1], end) if len(dates) else end
+    if len(dates) == (last - first).days + 1 and dates.is_unique:
+        return df  # Already a row for every day
+    if not dates.is_unique:
+        # Hand edits can repeat a date; the last row for it wins, as on replay
+        df = df.drop_duplicates('Date', keep='last')
+    if not (df.dtypes.drop('Date') == bool).all():
+        # String columns from hand edits would not take the False fill
+        df = coerce_habit_columns(df)
+    days = pd.date_range(first, last, freq='D')
+    filled = df.set_index('Date').reindex(days, fill_value=False)
+    return filled.rename_axis('Date').reset_index()
+
+def stored_rows(df):
+    """Returns the rows of df that MISSING_DAYS_STORAGE says to write."""
+    if MISSING_DAYS_STORAGE != 'sparse':
+        return df
+    habits = [col for col in df.columns if col != 'Date']
+    if not (df.dtypes.drop('Date') == bool).all():
+        done = coerce_habit_columns(df)[habits].any(axis=1)
+    else:
+        done = df[habits].any(axis=1)
+    return df if done.all() else df[done]
+
+def add_habit(habit_name, df):
+    """Adds a new habit column to the DataFrame."""
+    if habit_name and habit_name not in df.columns:
+        df[habit_name] = False # Default new habit to False for existing dates
+        st.success(f"Habit '{habit_name}' added!")
+        return df
+    elif habit_name in df.columns:
+        st.warning(f"Habit '{habit_name}' already exists.")
+        return df
+    else:
+        st.error("Habit name cannot be empty.")
+        return df
+
+def ensure_today_exists(df, token=None):
+    """Checks if today's date exists, adds a row if not.
+
+    With FILL_MISSING_DAYS the days missed since the last stored one are
+    added too (see fill_missing_days). Sparse storage leaves gaps in every
+    load, so the filled frame is cached between reruns under token, a
+    HabitStorage.data_token(). It takes one entry per storage location in
+    the habit data cache; without a token it is always rebuilt.
+    """
+    today = pd.Timestamp(date.today())
+    if FILL_MISSING_DAYS:
+        if token is None:
+            return fill_missing_days(df, today)
+        path, signature = _view_path(token[0], 'filled'), (token, today)
+        filled = _cache_lookup(path, signature)
+        if filled is None:
+            # df may come back unchanged; the cache must not share it with the caller
+            filled = _cache_store(path, signature, _share(fill_missing_days(df, today)))
+        return filled
+    if find_day(df, today) is None:
+        new_row = {'Date': today}
+        # Initialize habit columns to False for the new day
+        for col in df.columns:
+            if col != 'Date':
+                new_row[col] = False
+        # Use pandas.concat instead of append; today almost always sorts
+        # last, so normalize_frame only re-sorts after a clock change
+        df = normalize_frame(pd.concat([df, pd.DataFrame([new_row])], ignore_index=True))
+    return df
+
+
+# --- Concurrency ---
+def _signatures(*paths):
+    """Returns the file signatures of paths, with None for missing files."""
+    return tuple(_file_signature(path) if os.path.exists(path) else None
+                 for path in paths)
+
+@st.cache_resource
+def _lock_state():
+    """Process-wide lock wait counters (and the fallback lock without fcntl)."""
+    return {'lock': threading.Lock(), 'fallbacks': {},
+            'acquisitions': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+
+def _record_lock_wait(state, waited):
+    with state['lock']:
+        state['acquisitions'] += 1
+        state['total_wait'] += waited
+        state['max_wait'] = max(state['max_wait'], waited)
+
+def lock_wait_stats():
+    """Returns how often the data lock was taken and how long callers waited."""
+    state = _lock_state()
+    with state['lock']:
+        return {key: state[key] for key in ('acquisitions', 'total_wait', 'max_wait')}
+
+@contextmanager
+def habit_data_lock(exclusive=False, path=HABITS_LOCK_FILE):
+    """Holds the lock file at path shared (readers) or exclusive (writers).
+
+    The lock is a flock on a separate file, so it works across processes and
+    survives the atomic renames of the data files themselves. Without fcntl
+    (Windows) sessions are only serialized within this process.
+    """
+    state = _lock_state()
+    start = time.perf_counter()
+    if fcntl is None:
+        with state['lock']:
+            fallback = state['fallbacks'].setdefault(os.path.abspath(path), threading.Lock())
+        with fallback:
+            _record_lock_wait(state, time.perf_counter() - start)
+            yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        _record_lock_wait(state, time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _merge_frames(current, ours):
+    """Merges a frame loaded before another session's write into the stored one.
+
+    Stored cell values win, since every toggle is persisted as it happens;
+    ours only adds the habits and dates missing from current.
+    """
+    current = current.assign(Date=pd.to_datetime(current['Date']))
+    ours = ours.assign(Date=pd.to_datetime(ours['Date']))
+    merged = normalize_frame(pd.concat(
+        [current, ours[~ours['Date'].isin(current['Date'])]], ignore_index=True))
+    by_date = ours.set_index('Date')
+    for habit in ours.columns:
+        if habit not in current.columns:
+            merged[habit] = merged['Date'].map(by_date[habit]).eq(True)
+    return merged
+
+@st.cache_resource
+def _year_versions():
+    """Process-wide record of which years this process's writes touched.
+
+    locations maps a storage location to the stored version it was last
+    seen at, a generation bumped by every change not pinned to one day (full
+    saves, writes by other processes) and a count of cell writes per year.
+    """
+    return {'lock': threading.Lock(), 'locations': {}}
+
+def _year_entry(state, location):
+    return state['locations'].setdefault(
+        location, {'version': None, 'generation': 0, 'years': {}})
+
+def _record_write(location, before, after, day=None):
+    """Records a write that took location's data from version before to after.
+
+    day is the date of a cell write; None means any year may have changed.
+    Call under the exclusive data lock, so before is the version written over.
+    """
+    state = _year_versions()
+    with state['lock']:
+        entry = _year_entry(state, location)
+        if day is None or entry['version'] != before:
+            entry['generation'] += 1
+        else:
+            year = pd.Timestamp(day).year
+            entry['years'][year] = entry['years'].get(year, 0) + 1
+        entry['version'] = after
+
+
+# --- Write-Behind ---
+@st.cache_resource
+def _write_behind_state():
+    """Process-wide write-behind queue and its single writer thread.
+
+    pending maps each storage location to the full saves queued for it, one
+    (storage, frame) per storage object so sessions never replace each
+    other's, and to the queued cell changes keyed by (date, habit), so
+    repeated toggles of a cell coalesce. Cell changes are written through
+    the latest session's storage and frame. inflight holds the batch being
+    written, so loads still see it.
+    """
+    state = {'cond': threading.Condition(), 'write_lock': threading.Lock(),
+             'pending': {}, 'inflight': {},
+             'enqueued': 0, 'written': 0, 'flushes': 0, 'errors': 0}
+    threading.Thread(target=_write_behind_loop, args=(state,),
+                     name='habit-write-behind', daemon=True).start()
+    atexit.register(flush_writes, state)
+    return state
+
+def _write_behind_loop(state):
+    while True:
+        with state['cond']:
+            while not state['pending']:
+                state['cond'].wait()
+        # Let the writes that follow the first one join its batch
+        time.sleep(WRITE_BEHIND_INTERVAL)
+        flush_writes(state)
+
+def _enqueue_write(storage, df, day=None, changes=None):
+    """Queues a full save of df, or the given {habit: value} changes to day."""
+    state = _write_behind_state()
+    # Sessions keep editing their frame in place, so queue a snapshot
+    df = df.copy()
+    with state['cond']:
+        entry = state['pending'].setdefault(storage.location, {'saves': {}, 'changes': {}})
+        entry['storage'], entry['df'] = storage, df
+        if changes is None:
+            entry['saves'][id(storage)] = (storage, df)
+        else:
+            day = pd.Timestamp(day)
+            for habit, value in changes.items():
+                entry['changes'][(day, habit)] = bool(value)
+        state['enqueued'] += 1
+        state['cond'].notify()
+
+def flush_writes(state=None):
+    """Writes out everything queued for write-behind, in the calling thread."""
+    state = state or _write_behind_state()
+    with state['write_lock']:
+        with state['cond']:
+            batch, state['pending'] = state['pending'], {}
+            state['inflight'] = batch
+        for entry in batch.values():
+            storage, df = entry['storage'], entry['df']
+            by_day = {}
+            for (day, habit), value in entry['changes'].items():
+                by_day.setdefault(day, {})[habit] = value
+            if by_day:
+                # The frame is only the last session's; a rewrite must also
+                # carry the cells other sessions queued
+                df = _apply_cell_changes(normalize_frame(df), _cell_changes_frame(entry))
+            try:
+                for saver, saved in entry['saves'].values():
+                    saver._save_now(saved)
+                for day, changes in by_day.items():
+                    storage._save_changes_now(df, day, changes)
+            except Exception:
+                logger.exception("Write-behind failed for %s; requeued", storage.location)
+                _requeue(state, storage.location, entry)
+                continue
+            with state['cond']:
+                state['written'] += len(entry['saves']) + len(entry['changes'])
+        with state['cond']:
+            state['inflight'] = {}
+            if batch:
+                state['flushes'] += 1
+
+def _requeue(state, location, entry):
+    """Puts back a batch entry that failed to write, under anything queued since."""
+    with state['cond']:
+        newer = state['pending'].get(location)
+        if newer is not None:
+            entry['saves'].update(newer['saves'])
+            entry['changes'].update(newer['changes'])
+            entry['storage'], entry['df'] = newer['storage'], newer['df']
+        state['pending'][location] = entry
+        state['errors'] += 1
+        state['cond'].notify()
+
+def _overlay_pending_writes(location, df):
+    """Applies the writes still queued for location to a frame loaded from it.
+
+    A queued full save contributes its new habits and dates, as a save over
+    newer stored data would; queued cell changes are applied as they are.
+    """
+    state = _write_behind_state()
+    with state['cond']:
+        entries = [batch[location] for batch in (state['inflight'], state['pending'])
+                   if location in batch]
+    for entry in entries:
+        for _, saved in entry['saves'].values():
+            df = _merge_frames(df, saved)
+        if entry['changes']:
+            df = _apply_cell_changes(df, _cell_changes_frame(entry))
+    return df
+
+def _cell_changes_frame(entry):
+    """Returns a queued entry's cell changes as a (Date, Habit, Value) frame."""
+    return pd.DataFrame(
+        [(day, habit, value) for (day, habit), value in entry['changes'].items()],
+        columns=['Date', 'Habit', 'Value'])
+
+def _has_pending_writes(location):
+    state = _write_behind_state()
+    with state['cond']:
+        return location in state['pending'] or location in state['inflight']
+
+def write_behind_stats():
+    """Returns the write-behind queue depth and its lifetime counters.
+
+    queue_depth counts the full saves and distinct cells not yet written.
+    """
+    if not WRITE_BEHIND:
+        return dict.fromkeys(('queue_depth', 'enqueued', 'written', 'flushes', 'errors'), 0)
+    state = _write_behind_state()
+    with state['cond']:
+        depth = sum(len(entry['saves']) + len(entry['changes'])
+                    for batch in (state['inflight'], state['pending'])
+                    for entry in batch.values())
+        return {'queue_depth': depth,
+                **{key: state[key] for key in ('enqueued', 'written', 'flushes', 'errors')}}
+
+
+# --- Storage Backends ---
+class HabitStorage:
+    """Interface shared by the storage backends.
+
+    Frames are always in the wide layout used by the app: a 'Date' column
+    followed by one boolean column per habit. The public methods hold the
+    cross-process data lock and check for concurrent writers; backends
+    implement the underscored ones.
+
+    All files live in directory: the working directory for the shared data,
+    or a user's shard.
+    """
+    location = None
+    # Version token of the stored data as of this instance's last load
+    version = None
+    # Habit columns the last load() left out
+    excluded = frozenset()
+    # Change log entries replayed by the last _load()
+    log_entries = 0
+    # True if the last load() applied writes that were still queued
+    loaded_pending = False
+
+    def __init__(self, directory=''):
+        self.directory = directory
+        # The CSV and change log are the primary data or, for the other
+        # backends, what they are seeded from
+        self.csv_path = os.path.join(directory, HABITS_FILE)
+        self.log_path = os.path.join(directory, HABITS_LOG_FILE)
+        self.lock_path = os.path.join(directory, HABITS_LOCK_FILE)
+
+    def _version(self):
+        """Returns a token that changes whenever the stored data changes."""
+        return _signatures(self.location)
+
+    def _is_stale(self, current):
+        """True if another session has written since our last load.
+
+        current is the stored version now, read under the data lock.
+        """
+        return self.version is not None and current != self.version
+
+    def load(self, exclude=()):
+        """Returns the habit frame, including writes still queued.
+
+        Habit columns named in exclude (archived habits) are left out; full
+        saves through this instance write them back unchanged.
+        """
+        _attach_session(self.location)
+        exclude = frozenset(exclude)
+        # A flush that finished between reading the files and looking at the
+        # queue would leave its writes in neither, so hold the writer off
+        pause = _write_behind_state()['write_lock'] if WRITE_BEHIND else nullcontext()
+        with pause:
+            with habit_data_lock(path=self.lock_path):
+                self.log_entries = 0
+                df = self._load(exclude)
+                self.version = self._version()
+            if self._needs_upkeep():
+                # Importing and compacting write files, which a session reading
+                # under the shared lock must never see half done
+                with habit_data_lock(exclusive=True, path=self.lock_path):
+                    self.log_entries = 0
+                    df = self._load()
+                    if self._needs_upkeep():  # Unless another session got here first
+                        try:
+                            self._save(df)
+                        except Exception as e:
+                            st.error(f"Error saving habit data: {e}")
+                    self.version = self._version()
+            self.loaded_pending = WRITE_BEHIND and _has_pending_writes(self.location)
+            if self.loaded_pending:
+                df = _overlay_pending_writes(self.location, df)
+        self.excluded = exclude
+        # Backends skip them when reading; this catches an import or
+        # compaction, which reads everything, and queued writes
+        hidden = [col for col in df.columns if col in self.excluded and col != 'Date']
+        if hidden:
+            df = df.drop(columns=hidden)
+        return normalize_frame(df)
+
+    def data_token(self):
+        """Returns a hashable token for the data of the last load(), or None.
+
+        Frames loaded under equal tokens are equal, so results derived from
+        them can be cached by token. None while writes to this location are
+        still queued, or if the last load() applied queued writes, as the
+        stored version does not describe them.
+        """
+        if (self.version is None or self.loaded_pending
+                or WRITE_BEHIND and _has_pending_writes(self.location)):
+            return None
+        return (self.location, self.version, self.excluded)
+
+    def year_version(self, year):
+        """Returns a token for one year of the data of the last load(), or None.
+
+        Unlike data_token() it only changes when a write touches that year or
+        the whole store, so results derived from one year outlive toggles on
+        other days. None whenever data_token() is None.
+        """
+        token = self.data_token()
+        if token is None:
+            return None
+        state = _year_versions()
+        with state['lock']:
+            entry = _year_entry(state, self.location)
+            if entry['version'] != self.version:
+                # Written by another process, or by a write we lost track of
+                entry['generation'] += 1
+                entry['version'] = self.version
+            return (self.location, self.excluded, entry['generation'],
+                    entry['years'].get(year, 0))
+
+    def _with_excluded(self, df):
+        """Adds the columns load() left out back to df, from the stored data."""
+        if not self.excluded:
+            return df
+        stored = normalize_frame(self._load())
+        hidden = [col for col in stored.columns
+                  if col in self.excluded and col not in df.columns]
+        if not hidden:
+            return df
+        merged = (df.set_index('Date')
+                  .join(stored.set_index('Date')[hidden], how='outer')
+                  .fillna(False).astype(bool))
+        return normalize_frame(merged.rename_axis('Date').reset_index())
+
+    def save(self, df):
+        """Replaces the stored data with the given frame.
+
+        If another session wrote since our load, its stored values win and df
+        only contributes the habits and dates the store does not have yet.
+        With WRITE_BEHIND the save is queued and this returns immediately.
+        """
+        if WRITE_BEHIND:
+            _enqueue_write(self, df)
+            return
+        try:
+            self._save_now(df)
+        except Exception as e:
+            st.error(f"Error saving habit data: {e}")
+
+    def _save_now(self, df):
+        with habit_data_lock(exclusive=True, path=self.lock_path):
+            before = self._version()
+            stale = self._is_stale(before)
+            if stale:
+                df = _merge_frames(self._load(), df)
+            else:
+                df = self._with_excluded(df)
+            self._save(df)
+            after = self._version()
+            _record_write(self.location, before, after)
+            if not stale:
+                self.version = after
+
+    def save_changes(self, df, day, changes):
+        """Persists several {habit: value} changes to one date in one write.
+
+        df already holds the new values. With WRITE_BEHIND the changes are
+        queued and this returns immediately.
+        """
+        if WRITE_BEHIND:
+            _enqueue_write(self, df, day, changes)
+            return
+        try:
+            self._save_changes_now(df, day, changes)
+        except Exception as e:
+            st.error(f"Error saving habit change: {e}")
+
+    def _save_changes_now(self, df, day, changes):
+        with habit_data_lock(exclusive=True, path=self.lock_path):
+            if self._needs_import():
+                # Cell writes would otherwise start a store without the CSV's data
+                self._save(self._load())
+            before = self._version()
+            stale = self._is_stale(before)
+            if stale:
+                # Re-apply just these cells on top of what is stored now
+                df = _merge_frames(self._load(), df)
+                row = df['Date'] == pd.Timestamp(day)
+                for habit, value in changes.items():
+                    df.loc[row, habit] = bool(value)
+            self._save_changes(df, day, changes)
+            after = self._version()
+            _record_write(self.location, before, after, day)
+            # Our frame lacks the other session's writes, so stay stale
+            if not stale:
+                self.version = after
+
+    def add_habit(self, habit, df):
+        """Persists a newly added habit; df already has its column.
+
+        The habit is recorded as a single not-done cell on the latest day,
+        so with a change log this appends one line instead of rewriting
+        HABITS_FILE.
+        """
+        day = df['Date'].max() if len(df) else date.today()
+        self.save_changes(df, day, {habit: False})
+
+    def _needs_import(self):
+        """True while a backend's own file has yet to be seeded from HABITS_FILE.
+
+        Until then _load() reads the CSV, and the first load() imports it.
+        """
+        return (self.location != self.csv_path and not os.path.exists(self.location)
+                and os.path.exists(self.csv_path))
+
+    def _needs_upkeep(self):
+        """True if the data just loaded should be written out in full first."""
+        return self._needs_import() or self.log_entries >= CHANGE_LOG_COMPACT_THRESHOLD
+
+    def _load_csv(self, exclude=frozenset()):
+        """Reads HABITS_FILE and its change log, for backends not yet imported."""
+        df, self.log_entries = _replay_change_log(
+            _read_habits_file(self.csv_path, exclude), self.log_path, exclude)
+        return df
+
+    def _load(self, exclude=frozenset()):
+        """Reads the stored data. Runs under the shared lock, so never writes.
+
+        The habit columns named in exclude may be left out.
+        """
+        raise NotImplementedError
+
+    def _cached_view(self, signature, build):
+        """Returns the frame built from the data as of signature, caching it."""
+        path = _view_path(self.location)
+        view = _cache_lookup(path, signature)
+        if view is None:
+            view = _cache_store(path, signature, build())
+        return view
+
+    def _save(self, df):
+        """Writes df in full. Errors are raised, for the caller to report."""
+        raise NotImplementedError
+
+    def _save_changes(self, df, day, changes):
+        raise NotImplementedError
+
+
+class CsvStorage(HabitStorage):
+    """Wide table in HABITS_FILE, with toggles optionally kept in a change log."""
+
+    def __init__(self, directory=''):
+        super().__init__(directory)
+        self.location = self.csv_path
+
+    def _version(self):
+        return _signatures(self.location, self.log_path)
+
+    def _load(self, exclude=frozenset()):
+        return self._load_csv(exclude)
+
+    def _save(self, df):
+        save_habit_data(df, self.location, self.log_path)
+
+    def _save_changes(self, df, day, changes):
+        if PERSISTENCE_MODE == 'changelog':
+            append_habit_changes(day, changes, self.log_path)
+        else:
+            self._save(self._with_excluded(df))
+
+
+class SqliteStorage(HabitStorage):
+    """Long-format (date, habit, value) table in a SQLite database.
+
+    A toggle is a single-row UPSERT and a one-day lookup is an indexed query,
+    so neither depends on the length of the history. The database runs in
+    SQLite's own WAL mode, with WAL_SYNC_MODE mapped onto its synchronous
+    setting.
+    """
+    _SYNCHRONOUS = {'always': 'FULL', 'batch': 'NORMAL', 'off': 'OFF'}
+    # The primary key already indexes lookups by date; habit gets its own
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS habits (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS habit_values (
+            date TEXT NOT NULL,
+            habit TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (date, habit)
+        );
+        CREATE INDEX IF NOT EXISTS idx_habit_values_habit ON habit_values (habit);
+    """
+
+    def __init__(self, path=HABITS_DB_FILE, directory=''):
+        super().__init__(directory)
+        self.location = os.path.join(directory, path)
+
+    def _version(self):
+        # Commits land in the -wal file until a checkpoint, so watch it too
+        return _signatures(self.location, self.location + '-wal')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.location)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f"PRAGMA synchronous={self._SYNCHRONOUS.get(WAL_SYNC_MODE, 'FULL')}")
+        conn.executescript(self._SCHEMA)
+        return conn
+
+    def add_habit(self, habit, df):
+        # Days without a stored value read as False, so no cells are written
+        with habit_data_lock(exclusive=True, path=self.lock_path):
+            try:
+                if self._needs_import():
+                    self._save(self._load())
+                before = self._version()
+                stale = self._is_stale(before)
+                with closing(self._connect()) as conn, conn:
+                    self._register_habits(conn, [habit])
+            except Exception as e:
+                st.error(f"Error saving habit data: {e}")
+                invalidate_habit_cache(self.location)
+                return
+            after = self._version()
+            _record_write(self.location, before, after)
+            _cache_update(self.location, self._signature(before, self.excluded),
+                          self._signature(after, self.excluded),
+                          lambda cached: self._with_habit(cached, habit))
+            if not stale:
+                self.version = after
+
+    def _signature(self, version, exclude):
+        """Returns the signature of the cached data as of version.
+
+        The cached frame leaves out the habits in exclude, so it is part of it.
+        """
+        return (version, exclude)
+
+    def _with_habit(self, cached, habit):
+        """Returns the cached data with a newly registered habit added."""
+        return cached if habit in cached.columns else cached.assign(**{habit: False})
+
+    def _register_habits(self, conn, habits):
+        for habit in habits:
+            conn.execute(
+                'INSERT OR IGNORE INTO habits (name, position) '
+                'SELECT ?, COALESCE(MAX(position) + 1, 0) FROM habits',
+                (habit,))
+
+    def _cached(self, exclude=frozenset()):
+        """Returns the cached data if the database is unchanged, else None."""
+        if not os.path.exists(self.location):
+            return None
+        # Checked before connecting: opening a connection costs more than the
+        # hit itself, and closing the last one removes the -wal file, so the
+        # signature is only stable while no connection is open
+        return _cache_lookup(self.location, self._signature(self._version(), exclude))
+
+    def _load(self, exclude=frozenset()):
+        if self._needs_import():
+            return self._load_csv(exclude)
+        cached = self._cached(exclude)
+        if cached is not None:
+            return cached
+        try:
+            with closing(self._connect()) as conn:
+                habits = [row[0] for row in
+                          conn.execute('SELECT name FROM habits ORDER BY position')
+                          if row[0] not in exclude]
+                long_df = pd.read_sql_query(
+                    'SELECT date, habit, value FROM habit_values WHERE habit NOT IN '
+                    f"({', '.join('?' * len(exclude))})", conn, params=tuple(exclude))
+            signature = self._signature(self._version(), exclude)
+        except Exception as e:
+            st.error(f"Error loading habit data: {e}")
+            return pd.DataFrame(columns=['Date'])
+
+        wide = long_df.pivot(index='date', columns='habit', values='value')
+        wide = wide.reindex(columns=habits).fillna(0).astype(bool)
+        wide.index = pd.to_datetime(wide.index, format=DATE_FORMAT)
+        df = wide.sort_index().rename_axis('Date').reset_index()
+        df.columns.name = None
+        return _cache_store(self.location, signature, df)
+
+    def _save(self, df):
+        habits = [col for col in df.columns if col != 'Date']
+        long_df = df.melt(id_vars='Date', value_vars=habits,
+                          var_name='habit', value_name='value')
+        values = long_df['value'].fillna(False).astype(bool)
+        if MISSING_DAYS_STORAGE == 'sparse':
+            # A missing cell reads as not done, so only completions are stored
+            long_df, values = long_df[values], values[values]
+        dates = pd.to_datetime(long_df['Date']).dt.strftime(DATE_FORMAT)
+        values = values.astype(int)
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM habits')
+                conn.execute('DELETE FROM habit_values')
+                conn.executemany('INSERT INTO habits (name, position) VALUES (?, ?)',
+                                 [(habit, i) for i, habit in enumerate(habits)])
+                conn.executemany(
+                    'INSERT INTO habit_values (date, habit, value) VALUES (?, ?, ?)',
+                    zip(dates, long_df['habit'], values))
+        finally:
+            invalidate_habit_cache(self.location)
+
+    def _save_changes(self, df, day, changes):
+        before = self._version()
+        try:
+            with closing(self._connect()) as conn, conn:
+                self._register_habits(conn, changes)
+                self._write_cells(conn, day, changes)
+        except Exception:
+            invalidate_habit_cache(self.location)
+            raise
+        else:
+            # Patch the cached data with the same cells, so the next load
+            # does not re-read the whole table
+            _cache_update(self.location, self._signature(before, self.excluded),
+                          self._signature(self._version(), self.excluded),
+                          lambda cached: self._with_changes(cached, day, changes))
+
+    def _write_cells(self, conn, day, changes):
+        conn.executemany(
+            'INSERT INTO habit_values (date, habit, value) VALUES (?, ?, ?) '
+            'ON CONFLICT (date, habit) DO UPDATE SET value = excluded.value',
+            [(day_key(day), habit, int(bool(value))) for habit, value in changes.items()])
+
+    def _with_changes(self, cached, day, changes):
+        """Returns the cached data with one day's {habit: value} cells set."""
+        return _set_day_values(cached, day, {habit: value for habit, value in changes.items()
+                                             if habit not in self.excluded})
+
+
+class EventStorage(SqliteStorage):
+    """Sparse long format: only the completed (date, habit) pairs, in SQLite.
+
+    Unticking a habit deletes its event, so the database grows with
+    completions rather than days x habits, and adding a habit is a single
+    insert. The cache holds a HabitEvents, which toggles patch in place; the
+    wide frame built from it by load() is cached as a separate, evictable
+    entry.
+    """
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS habits (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS completions (
+            date TEXT NOT NULL,
+            habit TEXT NOT NULL,
+            PRIMARY KEY (date, habit)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path=HABITS_EVENTS_FILE, directory=''):
+        super().__init__(path, directory)
+
+    def _read(self):
+        if self._needs_import():
+            return HabitEvents.from_frame(coerce_habit_columns(self._load_csv()))
+        cached = self._cached()
+        if cached is not None:
+            return cached
+        with closing(self._connect()) as conn:
+            habits = [row[0] for row in
+                      conn.execute('SELECT name FROM habits ORDER BY position')]
+            events = pd.read_sql_query(
+                'SELECT date AS Date, habit AS Habit FROM completions ORDER BY date', conn)
+        signature = self._version()
+        events['Date'] = pd.to_datetime(events['Date'], format=DATE_FORMAT)
+        return _cache_store(self.location, signature, HabitEvents(habits, events))
+
+    def _signature(self, version, exclude):
+        # The cache holds every habit's events; only the frame view excludes
+        return version
+
+    def _load(self, exclude=frozenset()):
+        try:
+            if self._needs_import() or not os.path.exists(self.location):
+                return self._read().to_frame(exclude)
+            return self._cached_view((self._version(), exclude),
+                                     lambda: self._read().to_frame(exclude))
+        except Exception as e:
+            st.error(f"Error loading habit data: {e}")
+            return pd.DataFrame(columns=['Date'])
+
+    def _save(self, df):
+        events = HabitEvents.from_frame(coerce_habit_columns(df))
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM habits')
+                conn.execute('DELETE FROM completions')
+                conn.executemany('INSERT INTO habits (name, position) VALUES (?, ?)',
+                                 [(habit, i) for i, habit in enumerate(events.habits)])
+                conn.executemany(
+                    'INSERT INTO completions (date, habit) VALUES (?, ?)',
+                    zip(events.events['Date'].dt.strftime(DATE_FORMAT), events.events['Habit']))
+        finally:
+            invalidate_habit_cache(self.location)
+
+    def _write_cells(self, conn, day, changes):
+        key = day_key(day)
+        conn.executemany(
+            'INSERT OR IGNORE INTO completions (date, habit) VALUES (?, ?)',
+            [(key, habit) for habit, value in changes.items() if value])
+        conn.executemany(
+            'DELETE FROM completions WHERE date = ? AND habit = ?',
+            [(key, habit) for habit, value in changes.items() if not value])
+
+    def _with_habit(self, cached, habit):
+        cached.add_habit(habit)
+        return cached
+
+    def _with_changes(self, cached, day, changes):
+        for habit, value in changes.items():
+            cached.set(day, habit, value)
+        return cached
+
+
+class ColumnarStorage(HabitStorage):
+    """Typed columnar file (Parquet or Arrow IPC) plus the shared change log.
+
+    Loading skips CSV parsing and dtype inference entirely; an Arrow IPC file
+    is memory-mapped so large histories are not copied through Python.
+    """
+
+    def __init__(self, path=HABITS_COLUMNAR_FILE, directory=''):
+        super().__init__(directory)
+        self.location = os.path.join(directory, path)
+
+    def _version(self):
+        return _signatures(self.location, self.log_path)
+
+    def _read(self, exclude=frozenset()):
+        if not os.path.exists(self.location):
+            return pd.DataFrame(columns=['Date'])
+        signature = (_file_signature(self.location), exclude)
+        cached = _cache_lookup(self.location, signature)
+        if cached is not None:
+            return cached
+        return _cache_store(self.location, signature, _read_columnar(self.location, exclude))
+
+    def _load(self, exclude=frozenset()):
+        # Before the first import the change log belongs to the CSV; saving
+        # the import clears it
+        if self._needs_import():
+            return self._load_csv(exclude)
+        try:
+            df = self._read(exclude)
+        except Exception as e:
+            st.error(f"Error loading habit data: {e}")
+            return pd.DataFrame(columns=['Date'])
+        df, self.log_entries = _replay_change_log(df, self.log_path, exclude)
+        return df
+
+    def _save(self, df):
+        try:
+            _write_columnar(df, self.location)
+            _clear_change_log(self.log_path)
+        finally:
+            invalidate_habit_cache(self.location)
+
+    def _save_changes(self, df, day, changes):
+        if PERSISTENCE_MODE == 'changelog':
+            append_habit_changes(day, changes, self.log_path)
+        else:
+            self._save(self._with_excluded(df))
+
+
+class BitsetStorage(HabitStorage):
+    """Packed bit arrays (one bit per habit per day) in an .npz file.
+
+    The cache holds the HabitBitset rather than a DataFrame, and toggles and
+    one-day lookups work on the bits directly. The frame built from it by
+    load() is cached as a separate entry, which the byte budget counts and
+    can evict while the bits stay cached. Completion totals are not
+    popcounted here: every backend gets them from the AggregateStore, which
+    is updated per toggle.
+    """
+
+    def __init__(self, path=HABITS_BITSET_FILE, directory=''):
+        super().__init__(directory)
+        self.location = os.path.join(directory, path)
+
+    def _read(self):
+        if self._needs_import():
+            return HabitBitset.from_frame(coerce_habit_columns(self._load_csv()))
+        if not os.path.exists(self.location):
+            return HabitBitset.empty()
+        signature = _file_signature(self.location)
+        cached = _cache_lookup(self.location, signature)
+        if cached is not None:
+            return cached
+        return _cache_store(self.location, signature, HabitBitset.load(self.location))
+
+    def _write(self, bits):
+        try:
+            _atomic_write(self.location, bits.save)
+        finally:
+            invalidate_habit_cache(self.location)
+
+    def _load(self, exclude=frozenset()):
+        try:
+            if self._needs_import() or not os.path.exists(self.location):
+                return self._read().to_frame(exclude)
+            return self._cached_view((_file_signature(self.location), exclude),
+                                     lambda: self._read().to_frame(exclude))
+        except Exception as e:
+            st.error(f"Error loading habit data: {e}")
+            return pd.DataFrame(columns=['Date'])
+
+    def _save(self, df):
+        self._write(HabitBitset.from_frame(coerce_habit_columns(df)))
+
+    def _save_changes(self, df, day, changes):
+        # The packed file is tiny, so rewriting it is cheaper than a log
+        bits = self._read()
+        for habit, value in changes.items():
+            bits.set(day, habit, value)
+        self._write(bits)
+
+
+def user_shard_dir(user_id):
+    """Returns the directory holding one user's habit files.
+
+    User ids (usually email addresses) are hashed into a safe, fixed-length
+    name, fanned out over 256 subdirectories so no directory grows huge.
+    """
+    digest = hashlib.sha256(user_id.encode('utf-8')).hexdigest()
+    return os.path.join(USER_DATA_DIR, digest[:2], digest)
+
+def get_storage(user_id=None):
+    """Returns the storage backend selected by STORAGE_BACKEND.
+
+    Without a user_id this is the single shared data set in the working
+    directory; with one it is that user's own shard, created on first use.
+    """
+    directory = ''
+    if user_id is not None:
+        directory = user_shard_dir(user_id)
+        os.makedirs(directory, exist_ok=True)
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteStorage(directory=directory)
+    if STORAGE_BACKEND == 'events':
+        return EventStorage(directory=directory)
+    if STORAGE_BACKEND == 'columnar':
+        return ColumnarStorage(directory=directory)
+    if STORAGE_BACKEND == 'bitset':
+        return BitsetStorage(directory=directory)
+    return CsvStorage(directory=directory)
+
+
+if __name__ == '__main__':
+    import sys
+    # python storage.py [habits.csv] [habits.parquet|habits.arrow]
+    print(f"Wrote {convert_csv_to_columnar(*sys.argv[1:3])}")
@@ -1,127 +1,246 @@
+import os
+import sqlite3
 import streamlit as st
 import pandas as pd
-import os
 from datetime import date
 
-# Configuration
-HABITS_FILE = 'habits.csv'
-
-# --- Data Handling ---
-def load_habit_data():
-    """Loads habit data from CSV, creates file if it doesn't exist."""
-    if not os.path.exists(HABITS_FILE):
-        # Create empty DataFrame with just a Date column if file is new
-        df = pd.DataFrame(columns=['Date'])
-        df.to_csv(HABITS_FILE, index=False)
-        return df
-    else:
-        try:
-            return pd.read_csv(HABITS_FILE, parse_dates=['Date'])
-        except pd.errors.EmptyDataError:
-             # Handle case where file exists but is empty
-            df = pd.DataFrame(columns=['Date'])
-            df.to_csv(HABITS_FILE, index=False)
-            return df
-        except Exception as e:
-            st.error(f"Error loading habit data: {e}")
-            # Return an empty DataFrame on error to prevent app crash
-            return pd.DataFrame(columns=['Date'])
-
-
-def save_habit_data(df):
-    """Saves habit data to CSV."""
+from aggregates import HABITS_AGGREGATES_FILE, AggregateStore
+from heatmap import heatmap_chart, year_tile, years
+from instrumentation import finish_rerun, phase, render_debug_panel, start_rerun
+from registry import HABITS_REGISTRY_FILE, HabitRegistry, check_name
+from stats import rolling_stats
+from storage import add_habit, ensure_today_exists, find_day, get_storage, slice_days
+
+# Choices for the history viewer's page length, in days
+HISTORY_PAGE_DAYS = (30, 90, 365)
+# Collect today's toggles in a form and save them together on submit,
+# instead of saving (and rerunning) on every click
+BATCH_UPDATES = False
+# Give every logged-in user their own habits (needs st.login's [auth] section
+# in .streamlit/secrets.toml); when off, everyone shares one data set
+MULTI_USER = False
+
+# --- Today's Habits ---
+@st.fragment
+def today_habits(storage, aggregates, habits_df, today_index, habits):
+    """Checkbox grid for today; a toggle reruns only this fragment.
+
+    habits are the registry entries to show, in order. habits_df is the frame
+    from the last full run and is updated in place, so later toggles in the
+    fragment still see earlier ones.
+    """
+    today = habits_df.at[today_index, 'Date']
+    today_str = today.strftime('%Y-%m-%d')
+    habit_cols = [habit.column for habit in habits]
+    with phase('render_habits'):
+        grid = st.form('today_habits', border=False) if BATCH_UPDATES else st.container()
+        with grid:
+            cols = st.columns(len(habit_cols))
+            changes = {}
+            for i, habit in enumerate(habit_cols):
+                with cols[i]:
+                    # Ensure the value fetched is explicitly boolean for checkbox
+                    # Handle potential non-boolean values gracefully (e.g., from manual CSV edits)
+                    try:
+                        current_value = bool(habits_df.loc[today_index, habit])
+                    except ValueError:
+                        current_value = False # Default to False if conversion fails
+
+                    # Keyed by data column, which survives renames
+                    checked = st.checkbox(habits[i].name, value=current_value,
+                                          key=f"{habit}_{today_str}")
+                    if checked != current_value:
+                        changes[habit] = checked
+            if BATCH_UPDATES:
+                # Form widgets only report new values once this is clicked
+                st.form_submit_button("Save")
+
+    if changes:
+        for habit, checked in changes.items():
+            habits_df.loc[today_index, habit] = checked
+        with phase('save'):
+            storage.save_changes(habits_df, today, changes)
+        with phase('aggregates'):
+            for habit, checked in changes.items():
+                aggregates.apply_change(today, habit, checked)
+        # No rerun needed here, checkbox updates state automatically
+
+    # Read after the loop so the captions include this run's toggles
+    with phase('streaks'):
+        streaks = aggregates.current_streaks()
+        for i, habit in enumerate(habit_cols):
+            current, longest = streaks.get(habit, (0, 0))
+            rest = "" if habits[i].due(today) else " · not scheduled today"
+            with cols[i]:
+                st.caption(f"🔥 {current} day streak · best {longest}{rest}")
+
+
+# --- History ---
+@st.fragment
+def history_view(habits_df, names):
+    """Pages through the history by date range, newest page first.
+
+    Only the rows of the selected window are sent to the browser, and paging
+    reruns just this fragment.
+    """
+    first, last = habits_df['Date'].iat[0], habits_df['Date'].iat[-1]
+    page_days = st.selectbox("Days per page", HISTORY_PAGE_DAYS, key='history_page_days')
+    pages = (last - first).days // page_days + 1
+    page = st.number_input(f"Page (1 is the most recent, {pages} in total)",
+                           min_value=1, max_value=pages, value=1, key='history_page')
+    end = last - pd.Timedelta(days=(page - 1) * page_days)
+    start = end - pd.Timedelta(days=page_days - 1)
+    st.caption(f"{start:%Y-%m-%d} to {end:%Y-%m-%d}")
+    window = slice_days(habits_df, start, end).iloc[::-1].rename(columns=names)
+    st.dataframe(window, column_config={
+        'Date': st.column_config.DateColumn(format='YYYY-MM-DD')})
+
+
+# --- Completion Rates ---
+def completion_rates(rates, overall, names):
+    """Per-habit and overall rolling completion rates, with their history."""
+    st.subheader("Completion Rates")
+    table = rates.loc[list(names)].rename(index=names)
+    progress = {col: st.column_config.ProgressColumn(col, format='percent',
+                                                     min_value=0, max_value=1)
+                for col in table.columns}
+    st.dataframe(table, column_config=progress)
+    if len(overall):
+        # A table of its own, so no habit's name can clash with the label
+        st.dataframe(overall.iloc[[-1]].set_axis(["All habits"]), column_config=progress)
+    st.line_chart(overall, y_label="All habits")
+
+
+# --- Calendar ---
+@st.fragment
+def calendar_view(storage, habits_df, names):
+    """Per-year heatmap of one habit, or of how many habits were done each day."""
+    year_col, habit_col = st.columns(2)
+    year = year_col.selectbox("Year", years(habits_df), key='calendar_year')
+    habit = habit_col.selectbox("Habit", [None, *names], key='calendar_habit',
+                                format_func=lambda col: "All habits" if col is None else names[col])
+    if year is None:
+        return
+    tile = year_tile(storage.location, habits_df, year, storage.year_version(year))
+    st.altair_chart(heatmap_chart(tile, habit, "Done" if habit else "Habits done"),
+                    width='stretch')
+
+
+# --- Habit Registry ---
+def edit_registry(registry):
+    """Sidebar table for renaming, rescheduling, archiving and reordering."""
+    original = registry.frame()
+    if original.empty:
+        return
+    with st.sidebar.expander("Edit Habits"):
+        st.caption("Schedule is 'daily' or weekdays such as 'Mon,Wed,Fri'. "
+                   "Archived habits keep their history but are not loaded.")
+        edited = st.data_editor(original, key='habit_registry', num_rows='fixed',
+                                disabled=['id'])
+    changed = edited.ne(original).any(axis=1)
+    if not changed.any():
+        return
     try:
-        df.to_csv(HABITS_FILE, index=False)
-    except Exception as e:
-        st.error(f"Error saving habit data: {e}")
-
-def add_habit(habit_name, df):
-    """Adds a new habit column to the DataFrame."""
-    if habit_name and habit_name not in df.columns:
-        df[habit_name] = False # Default new habit to False for existing dates
-        st.success(f"Habit '{habit_name}' added!")
-        return df
-    elif habit_name in df.columns:
-        st.warning(f"Habit '{habit_name}' already exists.")
-        return df
-    else:
-        st.error("Habit name cannot be empty.")
-        return df
-
-def ensure_today_exists(df):
-    """Checks if today's date exists, adds a row if not."""
-    today_str = date.today().strftime('%Y-%m-%d')
-    # Convert 'Date' column to string for comparison if it's datetime objects
-    if pd.api.types.is_datetime64_any_dtype(df['Date']):
-        df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
-
-    if today_str not in df['Date'].values:
-        new_row = {'Date': today_str}
-        # Initialize habit columns to False for the new day
-        for col in df.columns:
-            if col != 'Date':
-                new_row[col] = False
-        # Use pandas.concat instead of append
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    # Convert Date column back to datetime if needed, or keep as string
-    # df['Date'] = pd.to_datetime(df['Date']) # Optional: convert back
-    return df
+        for habit_id, row in edited[changed].iterrows():
+            registry.update(habit_id, name=row['Name'], schedule=row['Schedule'],
+                            archived=row['Archived'], position=int(row['Position']))
+    except (ValueError, sqlite3.IntegrityError) as e:
+        st.sidebar.error(f"Could not update habit: {e}")
+        return
+    # The editor replays its edits onto new data; start from the saved state
+    del st.session_state['habit_registry']
+    st.rerun()
 
 
 # --- App Logic ---
+rerun_start = start_rerun()
 st.set_page_config(page_title="Habit Tracker", layout="wide")
 st.title("✅ Habit Tracker")
 
+# Pick the user's shard, or the shared data set
+user_id = None
+if MULTI_USER:
+    user_id = st.user.get('email')
+    if not user_id:
+        st.info("Log in to see your habits.")
+        st.button("Log in", on_click=st.login)
+        st.stop()
+    st.sidebar.caption(f"Signed in as {user_id}")
+    st.sidebar.button("Log out", on_click=st.logout)
+
 # Load data
-habits_df = load_habit_data()
+storage = get_storage(user_id)
+aggregates = AggregateStore(os.path.join(storage.directory, HABITS_AGGREGATES_FILE))
+registry = HabitRegistry(os.path.join(storage.directory, HABITS_REGISTRY_FILE))
+with phase('load'):
+    habits_df = storage.load(exclude=registry.archived_columns())
+# Gives habits that predate the registry (or were added by hand) an id
+registry.sync([col for col in habits_df.columns if col != 'Date'])
+# Identifies the loaded data, for results cached across reruns
+data_token = storage.data_token()
 
 # Ensure today's date row exists
-habits_df = ensure_today_exists(habits_df)
+with phase('ensure_today'):
+    habits_df = ensure_today_exists(habits_df, data_token)
 
 # Add new habit section
 st.sidebar.header("Manage Habits")
 new_habit_name = st.sidebar.text_input("Add New Habit")
 if st.sidebar.button("Add Habit"):
-    habits_df = add_habit(new_habit_name, habits_df)
-    save_habit_data(habits_df) # Save immediately after adding
-    st.rerun() # Rerun to update the columns immediately
+    try:
+        name = check_name(new_habit_name)
+    except ValueError as e:
+        st.sidebar.error(str(e))
+    else:
+        if registry.find(name) is not None:
+            st.sidebar.warning(f"Habit '{name}' already exists.")
+        else:
+            column = registry.add(name).column
+            habits_df = add_habit(column, habits_df)
+            with phase('save'):
+                storage.add_habit(column, habits_df) # Save immediately after adding
+            aggregates.add_habit(column)
+            st.rerun() # Rerun to update the columns immediately
+edit_registry(registry)
 
 # Display Habits for Today
-st.header(f"Today's Habits ({date.today().strftime('%Y-%m-%d')})")
+today = pd.Timestamp(date.today())
+today_str = today.strftime('%Y-%m-%d')
+st.header(f"Today's Habits ({today_str})")
 
-today_str = date.today().strftime('%Y-%m-%d')
-today_index = habits_df[habits_df['Date'] == today_str].index
+today_index = find_day(habits_df, today)
 
-if not today_index.empty:
-    today_index = today_index[0] # Get the first index if multiple (shouldn't happen)
-    habit_cols = [col for col in habits_df.columns if col != 'Date']
+habit_cols = [col for col in habits_df.columns if col != 'Date']
+active = [habit for habit in registry.habits() if habit.column in habit_cols]
+if today_index is not None:
 
-    if not habit_cols:
+    if not active:
         st.info("No habits added yet. Add some using the sidebar!")
     else:
-        cols = st.columns(len(habit_cols))
-        updated = False
-        for i, habit in enumerate(habit_cols):
-            with cols[i]:
-                # Ensure the value fetched is explicitly boolean for checkbox
-                # Handle potential non-boolean values gracefully (e.g., from manual CSV edits)
-                try:
-                    current_value = bool(habits_df.loc[today_index, habit])
-                except ValueError:
-                    current_value = False # Default to False if conversion fails
-                
-                checked = st.checkbox(habit, value=current_value, key=f"{habit}_{today_str}")
-                if checked != current_value:
-                    habits_df.loc[today_index, habit] = checked
-                    updated = True
-
-        if updated:
-            save_habit_data(habits_df)
-            # No rerun needed here, checkbox updates state automatically
+        if not aggregates.matches(habit_cols):
+            # First run, or habits were changed outside the app
+            with phase('aggregates_rebuild'):
+                aggregates.rebuild(habits_df)
+        # Before the grid, which may update habits_df in place: the cached
+        # rates belong to the frame as loaded
+        with phase('rolling'):
+            rates, overall = rolling_stats(
+                habits_df, data_token, schedules={habit.column: habit.schedule for habit in active})
+        today_habits(storage, aggregates, habits_df, today_index, active)
+        completion_rates(rates, overall, {habit.column: habit.name for habit in active})
 else:
-    st.error("Could not find or create today's row. Please check "+ HABITS_FILE)
+    st.error("Could not find or create today's row. Please check "+ storage.location)
+
+
+if st.toggle("Show Calendar"):
+    with phase('calendar'):
+        calendar_view(storage, habits_df, {habit.column: habit.name for habit in active})
 
+# Display Raw Data (Optional); a toggle rather than an expander, whose
+# contents would be built and sent on every rerun even while collapsed
+if st.toggle("Show All Habit Data"):
+    with phase('history'):
+        history_view(habits_df, {habit.column: habit.name for habit in active})
 
-# Display Raw Data (Optional)
-with st.expander("Show All Habit Data"):
-    st.dataframe(habits_df)
+render_debug_panel()
+finish_rerun(rerun_start)
@@ -0,0 +1,86 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+
+from aggregates import AggregateStore, compute_aggregates, verify
+
+
+def habits_frame(days=60, habits=('Read', 'Run', 'Swim'), seed=0):
+    rng = random.Random(seed)
+    dates = pd.date_range('2024-01-01', periods=days, freq='D')
+    return pd.DataFrame({'Date': dates,
+                         **{habit: [rng.random() < 0.5 for _ in dates] for habit in habits}})
+
+def toggle(store, df, day, habit, value):
+    df.loc[df['Date'] == day, habit] = value
+    store.apply_change(day, habit, value)
+
+
+def test_rebuild_matches_full_recompute(tmp_path):
+    df = habits_frame()
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    store.rebuild(df)
+    assert verify(store, df) == []
+    assert store.matches(['Read', 'Run', 'Swim'])
+    assert not store.matches(['Read'])
+
+def test_apply_change_tracks_full_recompute(tmp_path):
+    df = habits_frame()
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    store.rebuild(df)
+    rng = random.Random(1)
+    for _ in range(300):
+        day = pd.Timestamp(rng.choice(df['Date'].tolist()))
+        toggle(store, df, day, rng.choice(['Read', 'Run', 'Swim']), rng.random() < 0.5)
+        # Streak edits at the end of the history take the O(1) paths
+        toggle(store, df, df['Date'].iat[-1], 'Read', rng.random() < 0.5)
+    assert verify(store, df) == []
+
+def test_repeated_change_is_counted_once(tmp_path):
+    df = habits_frame()
+    df['Read'] = False
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    store.rebuild(df)
+    day = df['Date'].iat[10]
+    # Two sessions ticking the same cell from the same loaded frame
+    toggle(store, df, day, 'Read', True)
+    toggle(store, df, day, 'Read', True)
+    assert store.snapshot()['totals']['Read'][0] == 1
+    toggle(store, df, day, 'Read', False)
+    toggle(store, df, day, 'Read', False)
+    assert verify(store, df) == []
+
+def test_current_streaks(tmp_path):
+    today = date(2024, 3, 10)
+    dates = pd.date_range(today - timedelta(days=9), today, freq='D')
+    df = pd.DataFrame({'Date': dates,
+                       'Read': [True] * 3 + [False] + [True] * 5 + [False],
+                       'Run': [True] * 4 + [False] * 6})
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    store.rebuild(df)
+    # Read's run ended yesterday, so it is still current; Run lapsed
+    assert store.current_streaks(today) == {'Read': (5, 5), 'Run': (0, 4)}
+    assert compute_aggregates(df)['totals']['Read'] == (8, '2024-03-09', 5, 5)
+
+def test_added_habit_starts_empty_and_is_tracked(tmp_path):
+    df = habits_frame()
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    store.rebuild(df)
+    df['Walk'] = False
+    store.add_habit('Walk')
+    assert store.matches(['Read', 'Run', 'Swim', 'Walk'])
+    assert store.current_streaks(date(2024, 3, 1))['Walk'] == (0, 0)
+    toggle(store, df, df['Date'].iat[-1], 'Walk', True)
+    toggle(store, df, df['Date'].iat[-2], 'Walk', True)
+    assert store.current_streaks(date(2024, 3, 1))['Walk'] == (2, 2)
+    assert verify(store, df) == []
+
+def test_store_from_an_older_schema_does_not_match(tmp_path):
+    df = habits_frame()
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    store.rebuild(df)
+    with sqlite3.connect(store.path) as conn:
+        conn.execute('PRAGMA user_version = 0')
+    assert not store.matches(['Read', 'Run', 'Swim'])
@@ -0,0 +1,45 @@
+import io
+
+import pandas as pd
+
+from bitset import HabitBitset
+
+
+def habits_frame():
+    return pd.DataFrame({'Date': pd.to_datetime(['2024-01-10', '2024-01-11', '2024-01-13']),
+                         'Read': [True, False, True], 'Run': [False, True, True]})
+
+def dates(df):
+    return df['Date'].dt.strftime('%Y-%m-%d').tolist()
+
+
+def test_frame_round_trip():
+    df = HabitBitset.from_frame(habits_frame()).to_frame()
+    assert dates(df) == ['2024-01-10', '2024-01-11', '2024-01-13']
+    assert df['Read'].tolist() == [True, False, True]
+    assert df['Run'].tolist() == [False, True, True]
+
+def test_set_before_epoch_rebases_and_keeps_bits():
+    bits = HabitBitset.from_frame(habits_frame())
+    bits.set('2023-12-25', 'Run', True)
+    assert bits.epoch <= pd.Timestamp('2023-12-25').to_datetime64()
+    df = bits.to_frame()
+    assert dates(df) == ['2023-12-25', '2024-01-10', '2024-01-11', '2024-01-13']
+    assert df['Read'].tolist() == [False, True, False, True]
+    assert df['Run'].tolist() == [True, False, True, True]
+
+def test_set_after_end_grows_and_unset_clears():
+    bits = HabitBitset.from_frame(habits_frame())
+    bits.set('2024-06-01', 'Swim', True)
+    bits.set('2024-01-13', 'Read', False)
+    df = bits.to_frame()
+    assert dates(df) == ['2024-01-10', '2024-01-11', '2024-01-13', '2024-06-01']
+    assert df['Read'].tolist() == [True, False, False, False]
+    assert df['Swim'].tolist() == [False, False, False, True]
+
+def test_save_and_load():
+    bits = HabitBitset.from_frame(habits_frame())
+    buffer = io.BytesIO()
+    bits.save(buffer)
+    buffer.seek(0)
+    pd.testing.assert_frame_equal(HabitBitset.load(buffer).to_frame(), bits.to_frame())
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+from storage import (BitsetStorage, _cache_lookup, _cache_store, _habit_data_cache, _nbytes,
+                     _view_path, habit_cache_stats, invalidate_habit_cache)
+
+
+def frame(days):
+    return pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=days, freq='D'),
+                         'Read': np.ones(days, dtype=bool)})
+
+def cached_keys():
+    cache = _habit_data_cache()
+    with cache['lock']:
+        return list(cache['entries'])
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, monkeypatch):
+    paths = [str(tmp_path / f'{name}.csv') for name in 'abc']
+    size = _nbytes(frame(100))
+    monkeypatch.setattr(storage, 'HABIT_CACHE_MAX_BYTES', 2 * size)
+    _cache_store(paths[0], 'v1', frame(100))
+    _cache_store(paths[1], 'v1', frame(100))
+    assert _cache_lookup(paths[0], 'v1') is not None  # Now the most recent
+    _cache_store(paths[2], 'v1', frame(100))
+
+    keys = cached_keys()
+    assert os.path.abspath(paths[1]) not in keys
+    assert os.path.abspath(paths[0]) in keys and os.path.abspath(paths[2]) in keys
+    assert habit_cache_stats()['resident_bytes'] <= 2 * size
+
+def test_changed_signature_misses(tmp_path):
+    path = str(tmp_path / 'habits.csv')
+    _cache_store(path, 'v1', frame(3))
+    assert _cache_lookup(path, 'v2') is None
+    invalidate_habit_cache(path)
+    assert _cache_lookup(path, 'v1') is None
+
+def test_cached_copy_is_private(tmp_path):
+    path = str(tmp_path / 'habits.csv')
+    _cache_store(path, 'v1', frame(3))
+    df = _cache_lookup(path, 'v1')
+    df.loc[0, 'Read'] = False
+    assert _cache_lookup(path, 'v1')['Read'].all()
+
+def test_frame_view_is_counted_against_the_budget(tmp_path):
+    habit_storage = BitsetStorage(directory=str(tmp_path))
+    habit_storage.save(frame(3650))
+    habit_storage.load()
+
+    cache = _habit_data_cache()
+    with cache['lock']:
+        bits = cache['entries'][os.path.abspath(habit_storage.location)]
+        view = cache['entries'][os.path.abspath(_view_path(habit_storage.location))]
+    assert bits[2] == bits[1].nbytes
+    assert view[2] == _nbytes(view[1]) > bits[2]
+
+    # Toggles patch or drop the bits, and the view is rebuilt from them
+    df = habit_storage.load()
+    habit_storage.save_changes(df, '2024-01-01', {'Read': False})
+    assert not habit_storage.load()['Read'].iat[0]
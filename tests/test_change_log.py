@@ -0,0 +1,46 @@
+import pandas as pd
+
+import storage
+from storage import CsvStorage, invalidate_habit_cache, load_habit_data
+
+
+def habits_frame():
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+        'Read': [True, False, True],
+        'Run': [False, True, True],
+    })
+
+
+def test_change_log_replay_skips_torn_last_line(tmp_path):
+    path, log_path = tmp_path / 'habits.csv', tmp_path / 'habits.log.csv'
+    path.write_text('Date,Read\n2024-01-01,True\n2024-01-02,False\n')
+    # The last entry was cut short by a crash mid-append
+    log_path.write_text('2024-01-02,Read,True\n'
+                        '2024-01-03,Swim,True\n'
+                        '2024-01-01,Read,False\n'
+                        '2024-01-02,Swim,Tr')
+    df = load_habit_data(str(path), str(log_path))
+    assert list(df.columns) == ['Date', 'Read', 'Swim']
+    assert df['Date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-01', '2024-01-02', '2024-01-03']
+    assert df['Read'].tolist() == [False, True, False]
+    assert df['Swim'].tolist() == [False, False, True]
+
+def test_change_log_later_entry_wins(tmp_path):
+    path, log_path = tmp_path / 'habits.csv', tmp_path / 'habits.log.csv'
+    path.write_text('Date,Read\n2024-01-01,False\n')
+    log_path.write_text('2024-01-01,Read,True\n2024-01-01,Read,False\n2024-01-01,Read,True\n')
+    assert load_habit_data(str(path), str(log_path))['Read'].tolist() == [True]
+
+def test_compaction_folds_log_into_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'CHANGE_LOG_COMPACT_THRESHOLD', 2)
+    habit_storage = CsvStorage(directory=str(tmp_path))
+    habit_storage.save(habits_frame())
+    df = habit_storage.load()
+    habit_storage.save_changes(df, '2024-01-02', {'Read': True})
+    habit_storage.save_changes(df, '2024-01-03', {'Read': False})
+    invalidate_habit_cache(habit_storage.location)
+    df = CsvStorage(directory=str(tmp_path)).load()
+    assert not (tmp_path / 'habits.log.csv').exists()
+    assert 'False' in (tmp_path / 'habits.csv').read_text().splitlines()[3]
+    assert df['Read'].tolist() == [True, True, False]
@@ -0,0 +1,90 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import storage
+from storage import (BitsetStorage, ColumnarStorage, CsvStorage, EventStorage, SqliteStorage,
+                     habit_data_lock, invalidate_habit_cache)
+
+BACKENDS = [CsvStorage, SqliteStorage, EventStorage, ColumnarStorage, BitsetStorage]
+
+
+def habits_frame():
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+        'Read': [True, False, True],
+        'Run': [False, True, True],
+    })
+
+def fresh_load(make):
+    habit_storage = make()
+    invalidate_habit_cache(habit_storage.location)
+    return habit_storage.load()
+
+def assert_same_habits(actual, expected):
+    actual = actual.assign(Date=actual['Date'].astype('datetime64[ns]'))
+    expected = expected.assign(Date=expected['Date'].astype('datetime64[ns]'))
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_exclusive_lock_holds_off_readers(tmp_path):
+    path = str(tmp_path / 'habits.lock')
+    acquired = threading.Event()
+
+    def read():
+        with habit_data_lock(path=path):
+            acquired.set()
+
+    with habit_data_lock(exclusive=True, path=path):
+        reader = threading.Thread(target=read)
+        reader.start()
+        assert not acquired.wait(0.2)
+    reader.join(5)
+    assert acquired.is_set()
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize('mode', ['changelog', 'rewrite'])
+def test_stale_session_keeps_other_sessions_writes(tmp_path, monkeypatch, backend, mode):
+    # With 'rewrite' the CSV and columnar backends save whole frames, which
+    # a stale session must merge into the stored data first
+    monkeypatch.setattr(storage, 'PERSISTENCE_MODE', mode)
+
+    def make():
+        return backend(directory=str(tmp_path))
+
+    make().save(habits_frame())
+    first, second = make(), make()
+    first_df, second_df = first.load(), second.load()
+
+    first_df.loc[first_df['Date'] == '2024-01-01', 'Run'] = True
+    first.save_changes(first_df, '2024-01-01', {'Run': True})
+    # second loaded before that write, so its save has to merge
+    second_df.loc[second_df['Date'] == '2024-01-03', 'Read'] = False
+    second.save_changes(second_df, '2024-01-03', {'Read': False})
+    second_df['Swim'] = False
+    second.add_habit('Swim', second_df)
+
+    df = fresh_load(make)
+    expected = habits_frame().assign(Swim=False)
+    expected.loc[0, 'Run'] = True
+    expected.loc[2, 'Read'] = False
+    assert_same_habits(df, expected)
+
+def test_stale_full_save_adds_only_missing_habits(tmp_path):
+    def make():
+        return CsvStorage(directory=str(tmp_path))
+
+    make().save(habits_frame())
+    first, second = make(), make()
+    first_df, second_df = first.load(), second.load()
+    first_df.loc[0, 'Run'] = True
+    first.save_changes(first_df, '2024-01-01', {'Run': True})
+    # A full save from the stale session: stored values win, its new column is kept
+    second_df['Swim'] = True
+    second.save(second_df)
+
+    df = fresh_load(make)
+    assert df['Run'].tolist() == [True, True, True]
+    assert df['Swim'].tolist() == [True, True, True]
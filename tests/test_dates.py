@@ -0,0 +1,30 @@
+import pandas as pd
+
+from storage import find_day, normalize_frame, slice_days
+
+
+def test_normalize_frame_parses_and_sorts_dates():
+    df = normalize_frame(pd.DataFrame({'Date': ['2024-01-03', '2024-01-01', '2024-01-02'],
+                                       'Read': [True, False, True]}))
+    assert pd.api.types.is_datetime64_any_dtype(df['Date'])
+    assert df['Date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-01', '2024-01-02', '2024-01-03']
+    assert df['Read'].tolist() == [False, True, True]
+    assert list(df.index) == [0, 1, 2]
+
+def test_find_day():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-05']),
+                       'Read': [True, False, True]}, index=[10, 11, 12])
+    assert find_day(df, pd.Timestamp('2024-01-02')) == 11
+    assert find_day(df, pd.Timestamp('2024-01-03')) is None
+    assert find_day(df, pd.Timestamp('2023-12-31')) is None
+    assert find_day(df, pd.Timestamp('2024-01-06')) is None
+    assert find_day(df.iloc[:0], pd.Timestamp('2024-01-01')) is None
+
+def test_slice_days_is_inclusive_and_skips_gaps():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-05',
+                                               '2024-01-09']),
+                       'Read': [True, False, True, False]})
+    window = slice_days(df, pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-05'))
+    assert window['Date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-02', '2024-01-05']
+    assert len(slice_days(df, pd.Timestamp('2024-01-06'), pd.Timestamp('2024-01-08'))) == 0
+    assert len(slice_days(df, pd.Timestamp('2023-01-01'), pd.Timestamp('2025-01-01'))) == 4
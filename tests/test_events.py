@@ -0,0 +1,43 @@
+import pandas as pd
+
+from events import HabitEvents
+from storage import EventStorage, habit_cache_stats, invalidate_habit_cache
+
+
+def habits_frame():
+    return pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+                         'Read': [True, False, True], 'Run': [False, True, True]})
+
+
+def test_frame_round_trip_with_categorical_habits():
+    events = HabitEvents.from_frame(habits_frame())
+    assert isinstance(events.events['Habit'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(events.to_frame(), habits_frame(), check_dtype=False)
+    assert list(events.to_frame(exclude={'Run'}).columns) == ['Date', 'Read']
+
+def test_set_adds_and_removes_events():
+    events = HabitEvents.from_frame(habits_frame())
+    events.set('2024-01-02', 'Read', True)
+    events.set('2024-01-02', 'Read', True)
+    events.set('2024-01-03', 'Run', False)
+    events.set('2024-01-04', 'Swim', True)
+    df = events.to_frame()
+    assert list(df.columns) == ['Date', 'Read', 'Run', 'Swim']
+    assert df['Read'].tolist() == [True, True, True, False]
+    assert df['Run'].tolist() == [False, True, False, False]
+    assert df['Swim'].tolist() == [False, False, False, True]
+    assert len(events.events) == 5
+
+def test_toggle_patches_the_cache(tmp_path):
+    habit_storage = EventStorage(directory=str(tmp_path))
+    habit_storage.save(habits_frame())
+    invalidate_habit_cache(habit_storage.location)
+    df = habit_storage.load()
+    df.loc[1, 'Read'] = True
+    habit_storage.save_changes(df, '2024-01-02', {'Read': True})
+    misses = habit_cache_stats()['misses']
+    # The events are patched in place; only the frame view is rebuilt
+    assert habit_storage.load()['Read'].tolist() == [True, True, True]
+    assert habit_cache_stats()['misses'] == misses + 1
+    invalidate_habit_cache(habit_storage.location)
+    assert EventStorage(directory=str(tmp_path)).load()['Read'].tolist() == [True, True, True]
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from heatmap import build_tile, tile_cache_stats, year_tile, years
+from storage import CsvStorage, invalidate_habit_cache
+
+
+def two_years():
+    return pd.DataFrame({'Date': pd.to_datetime(['2023-06-01', '2024-01-01', '2024-03-01']),
+                         'Read': [True, True, False], 'Run': [False, True, True]})
+
+def tile_for(habit_storage, df, year):
+    return year_tile(habit_storage.location, df, year, habit_storage.year_version(year))
+
+def builds():
+    return tile_cache_stats()['builds']
+
+
+def test_build_tile_lays_out_the_calendar():
+    df = two_years()
+    days = df['Date'].to_numpy().astype('datetime64[D]')[1:]
+    tile = build_tile(2024, ['Read', 'Run'], days, df[['Read', 'Run']].to_numpy()[1:])
+    assert len(tile.days) == 366
+    # 1 January 2024 was a Monday
+    assert tile.days.loc[0, ['Week', 'Weekday']].tolist() == [0, 0]
+    assert tile.values()['Value'].sum() == 3
+    assert tile.values('Run')['Value'].iloc[[0, 60]].tolist() == [1, 1]
+    assert years(df) == [2024, 2023]
+
+def test_tiles_are_rebuilt_only_for_the_year_written(tmp_path):
+    habit_storage = CsvStorage(directory=str(tmp_path))
+    habit_storage.save(two_years())
+    df = habit_storage.load()
+    tile_for(habit_storage, df, 2023)
+    tile_for(habit_storage, df, 2024)
+    start = builds()
+
+    df.loc[2, 'Read'] = True
+    habit_storage.save_changes(df, '2024-03-01', {'Read': True})
+    assert tile_for(habit_storage, df, 2023) is tile_for(habit_storage, df, 2023)
+    assert builds() == start
+    assert tile_for(habit_storage, df, 2024).values('Read')['Value'].sum() == 2
+    assert builds() == start + 1
+
+def test_unrecorded_writes_rebuild_every_year(tmp_path):
+    habit_storage = CsvStorage(directory=str(tmp_path))
+    habit_storage.save(two_years())
+    df = habit_storage.load()
+    tile_for(habit_storage, df, 2023)
+    start = builds()
+
+    # As another process would: the file changes behind this one's back
+    df = two_years().assign(Read=True)
+    df.to_csv(habit_storage.location, index=False)
+    invalidate_habit_cache(habit_storage.location)
+    df = habit_storage.load()
+    assert tile_for(habit_storage, df, 2023).values('Read')['Value'].sum() == 1
+    assert builds() == start + 1
+
+def test_without_a_version_tiles_follow_the_rows():
+    df = two_years()
+    first = year_tile('nowhere', df, 2024)
+    assert year_tile('nowhere', df, 2024) is first
+    df.loc[2, 'Read'] = True
+    assert np.array_equal(year_tile('nowhere', df, 2024).done[60], [True, True])
@@ -0,0 +1,55 @@
+from datetime import date
+
+import pandas as pd
+
+import storage
+from storage import ensure_today_exists, fill_missing_days, stored_rows
+
+
+def gappy_frame():
+    return pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-04']),
+                         'Read': [True, False], 'Run': [False, True]})
+
+
+def test_fill_missing_days_adds_gaps_as_not_done():
+    df = fill_missing_days(gappy_frame(), '2024-01-05')
+    assert df['Date'].dt.strftime('%Y-%m-%d').tolist() == [
+        '2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']
+    assert df['Read'].tolist() == [True, False, False, False, False]
+    assert df['Run'].tolist() == [False, False, False, True, False]
+
+def test_fill_missing_days_keeps_complete_frame():
+    df = fill_missing_days(gappy_frame(), '2024-01-05')
+    assert fill_missing_days(df, '2024-01-05') is df
+
+def test_fill_missing_days_repeated_date_keeps_last_row():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-01', '2024-01-02']),
+                       'Read': ['True', 'False', 'True']})
+    df = fill_missing_days(df, '2024-01-02')
+    assert df['Read'].tolist() == [False, True]
+
+def test_stored_rows(monkeypatch):
+    df = fill_missing_days(gappy_frame(), '2024-01-05')
+    monkeypatch.setattr(storage, 'MISSING_DAYS_STORAGE', 'sparse')
+    assert stored_rows(df)['Date'].dt.day.tolist() == [1, 4]
+    monkeypatch.setattr(storage, 'MISSING_DAYS_STORAGE', 'dense')
+    assert len(stored_rows(df)) == 5
+
+def test_ensure_today_exists_caches_filled_frame_by_token(tmp_path, monkeypatch):
+    calls = []
+    def counted(df, end=None):
+        calls.append(end)
+        return fill_missing_days(df, end)
+    monkeypatch.setattr(storage, 'fill_missing_days', counted)
+    token = (str(tmp_path / 'habits.csv'), ('v1',), frozenset())
+
+    first = ensure_today_exists(gappy_frame(), token)
+    first.loc[0, 'Read'] = False  # Sessions edit their frame in place
+    second = ensure_today_exists(gappy_frame(), token)
+    assert len(calls) == 1
+    assert second['Read'].iat[0]
+    assert second['Date'].iat[-1] == pd.Timestamp(date.today())
+
+    ensure_today_exists(gappy_frame(), (token[0], ('v2',), frozenset()))
+    ensure_today_exists(gappy_frame())
+    assert len(calls) == 3
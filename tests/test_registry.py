@@ -0,0 +1,85 @@
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from registry import HabitRegistry, check_name, parse_schedule
+from storage import (BitsetStorage, ColumnarStorage, CsvStorage, EventStorage, SqliteStorage,
+                     _habit_data_cache, invalidate_habit_cache)
+
+BACKENDS = [CsvStorage, SqliteStorage, EventStorage, ColumnarStorage, BitsetStorage]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return HabitRegistry(str(tmp_path / 'registry.db'))
+
+
+def test_add_assigns_ids_and_positions(registry):
+    read, run = registry.add(' Read '), registry.add('Run')
+    assert (read.name, read.column, read.schedule) == ('Read', 'Read', 'daily')
+    assert run.position == read.position + 1
+    assert [habit.name for habit in registry.habits()] == ['Read', 'Run']
+
+def test_rename_keeps_the_data_column(registry):
+    habit = registry.add('Read')
+    registry.update(habit.id, name='Reading')
+    assert registry.find('Read') is None
+    assert registry.find('Reading').column == 'Read'
+    # A new habit taking the old name needs another column
+    assert registry.add('Read').column == 'Read #2'
+
+def test_archived_habits_are_hidden(registry):
+    read, run = registry.add('Read'), registry.add('Run')
+    registry.update(run.id, archived=True)
+    assert [habit.name for habit in registry.habits()] == ['Read']
+    assert registry.archived_columns() == {'Run'}
+    assert registry.find('Run').archived
+
+@pytest.mark.parametrize('name', ['Date', '', '   ', None])
+def test_reserved_and_empty_names_are_rejected(registry, name):
+    with pytest.raises(ValueError):
+        check_name(name)
+    with pytest.raises(ValueError):
+        registry.add(name)
+
+def test_sync_registers_unknown_columns_once(registry):
+    registry.sync(['Read', 'Run'])
+    registry.sync(['Read', 'Run', 'Date'])
+    assert [habit.column for habit in registry.habits()] == ['Read', 'Run']
+
+def test_schedules(registry):
+    assert parse_schedule('') == 'daily'
+    assert parse_schedule('fri, monday') == 'Mon,Fri'
+    with pytest.raises(ValueError):
+        parse_schedule('Funday')
+    habit = registry.add('Swim')
+    registry.update(habit.id, schedule='Mon,Wed')
+    habit = registry.find('Swim')
+    assert habit.due(date(2024, 1, 1)) and not habit.due(date(2024, 1, 2))
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=lambda cls: cls.__name__)
+def test_archived_columns_are_not_read(tmp_path, backend):
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-02']),
+                       'Read': [True, False], 'Run': [True, True]})
+    habit_storage = backend(directory=str(tmp_path))
+    habit_storage.save(df)
+    invalidate_habit_cache(habit_storage.location)
+    loaded = habit_storage.load(exclude={'Run'})
+    assert list(loaded.columns) == ['Date', 'Read']
+    cache = _habit_data_cache()
+    with cache['lock']:
+        cached = [entry[1] for key, entry in cache['entries'].items()
+                  if key.startswith(str(tmp_path) + os.sep) and isinstance(entry[1], pd.DataFrame)]
+    assert cached and all('Run' not in frame.columns for frame in cached)
+
+    # Writes through the session leave the archived history alone
+    loaded.loc[1, 'Read'] = True
+    habit_storage.save_changes(loaded, '2024-01-02', {'Read': True})
+    habit_storage.save(loaded)
+    invalidate_habit_cache(habit_storage.location)
+    stored = backend(directory=str(tmp_path)).load()
+    assert stored['Read'].tolist() == [True, True]
+    assert stored['Run'].tolist() == [True, True]
@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+import storage
+from storage import get_storage, invalidate_habit_cache, user_shard_dir
+
+
+def test_shard_dirs_are_fanned_out_and_distinct(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'USER_DATA_DIR', str(tmp_path))
+    first, second = user_shard_dir('a@example.com'), user_shard_dir('b@example.com')
+    assert first != second
+    assert first == user_shard_dir('a@example.com')
+    name = os.path.basename(first)
+    assert os.path.dirname(first) == os.path.join(str(tmp_path), name[:2])
+
+def test_users_do_not_share_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'USER_DATA_DIR', str(tmp_path))
+    first, second = get_storage('a@example.com'), get_storage('b@example.com')
+    assert os.path.isdir(first.directory)
+    assert first.location != second.location and first.lock_path != second.lock_path
+    first.save(pd.DataFrame({'Date': pd.to_datetime(['2024-01-01']), 'Read': [True]}))
+    invalidate_habit_cache(second.location)
+    assert 'Read' not in second.load().columns
@@ -0,0 +1,52 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from stats import rolling_stats
+
+
+def test_rates_count_only_scheduled_days():
+    # 1-14 January 2024; the 1st was a Monday
+    days = pd.date_range('2024-01-01', '2024-01-14', freq='D')
+    df = pd.DataFrame({'Date': days,
+                       'Gym': days.weekday.isin([0, 2]),
+                       'Read': days.weekday < 5})
+    rates, overall = rolling_stats(df, today=date(2024, 1, 14), windows=(7,),
+                                   schedules={'Gym': 'Mon,Wed'})
+    # Done on every scheduled day, so 100%, not 2 out of 7
+    assert rates.loc['Gym', '7 days'] == 1.0
+    assert np.isclose(rates.loc['Read', '7 days'], 5 / 7)
+    # Both habits together: 2 of 2 Gym days plus 5 of 7 Read days
+    assert np.isclose(overall['7 days'].iat[-1], 7 / 9)
+
+def test_rates_over_windows_and_gaps():
+    # 3 of the last 7 days are missing and count as not done
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-05', '2024-01-06',
+                                               '2024-01-08', '2024-01-10']),
+                       'Read': [True, True, True, False, True],
+                       'Run': [False, False, True, True, True]})
+    rates, overall = rolling_stats(df, today=date(2024, 1, 10), windows=(7, 30))
+    assert np.isclose(rates.loc['Read', '7 days'], 3 / 7)
+    assert np.isclose(rates.loc['Run', '7 days'], 3 / 7)
+    # Longer than the history: measured over the 10 days that exist
+    assert np.isclose(rates.loc['Read', '30 days'], 4 / 10)
+    assert overall.index[0] == pd.Timestamp('2024-01-01')
+    assert overall.index[-1] == pd.Timestamp('2024-01-10')
+    # With every habit daily the overall rate is the mean of the habits'
+    assert np.allclose(overall.iloc[-1], rates.mean())
+
+def test_history_reaches_today():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01']), 'Read': [True]})
+    rates, overall = rolling_stats(df, today=date(2024, 1, 7), windows=(7,))
+    assert np.isclose(rates.loc['Read', '7 days'], 1 / 7)
+    assert len(overall) == 7
+
+def test_cached_by_token():
+    df = pd.DataFrame({'Date': pd.to_datetime(['2024-01-01']), 'Read': [True]})
+    token = ('test_cached_by_token', 1, frozenset())
+    first = rolling_stats(df, token, today=date(2024, 1, 1))
+    # Under the same token the frame is not looked at again
+    df['Read'] = False
+    assert rolling_stats(df, token, today=date(2024, 1, 1))[0].equals(first[0])
+    assert rolling_stats(df, today=date(2024, 1, 1))[0].loc['Read', '7 days'] == 0
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from storage import (BitsetStorage, ColumnarStorage, CsvStorage, EventStorage, SqliteStorage,
+                     invalidate_habit_cache)
+
+BACKENDS = [CsvStorage, SqliteStorage, EventStorage, ColumnarStorage, BitsetStorage]
+
+
+def habits_frame():
+    # Every day has something done, so sparse and event storage keep all rows
+    return pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+        'Read': [True, False, True],
+        'Run': [False, True, True],
+    })
+
+def fresh_load(make):
+    """Loads through a new instance with the process cache dropped."""
+    habit_storage = make()
+    invalidate_habit_cache(habit_storage.location)
+    return habit_storage.load()
+
+def assert_same_habits(actual, expected):
+    actual = actual.assign(Date=actual['Date'].astype('datetime64[ns]'))
+    expected = expected.assign(Date=expected['Date'].astype('datetime64[ns]'))
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=lambda cls: cls.__name__)
+def test_backend_round_trip(tmp_path, backend):
+    def make():
+        return backend(directory=str(tmp_path))
+
+    df = habits_frame()
+    make().save(df)
+    assert_same_habits(fresh_load(make), df)
+
+    habit_storage = make()
+    df = habit_storage.load()
+    df.loc[df['Date'] == '2024-01-02', 'Read'] = True
+    habit_storage.save_changes(df, '2024-01-02', {'Read': True})
+    df['Swim'] = False
+    habit_storage.add_habit('Swim', df)
+    # The writing instance's cached copy and a cold read agree
+    assert_same_habits(habit_storage.load(), df)
+    assert_same_habits(fresh_load(make), df)
+
+@pytest.mark.parametrize('backend', BACKENDS, ids=lambda cls: cls.__name__)
+def test_backend_imports_csv_on_first_load(tmp_path, backend):
+    df = habits_frame()
+    CsvStorage(directory=str(tmp_path)).save(df)
+    assert_same_habits(fresh_load(lambda: backend(directory=str(tmp_path))), df)
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+import storage
+from storage import CsvStorage, flush_writes, invalidate_habit_cache, write_behind_stats
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    monkeypatch.setattr(storage, 'WRITE_BEHIND', True)
+    # Long enough that only the test's own flush_writes() writes
+    monkeypatch.setattr(storage, 'WRITE_BEHIND_INTERVAL', 60)
+    yield
+    flush_writes()
+
+def habits_frame():
+    return pd.DataFrame({'Date': pd.to_datetime(['2024-01-01', '2024-01-02']),
+                         'A': [True, True], 'B': [False, False], 'C': [True, True]})
+
+
+@pytest.mark.parametrize('mode', ['changelog', 'rewrite'])
+def test_queued_cells_of_every_session_are_written(tmp_path, monkeypatch, write_behind, mode):
+    monkeypatch.setattr(storage, 'PERSISTENCE_MODE', mode)
+    CsvStorage(directory=str(tmp_path))._save_now(habits_frame())
+    first, second = CsvStorage(directory=str(tmp_path)), CsvStorage(directory=str(tmp_path))
+    first_df, second_df = first.load(), second.load()
+
+    first_df.loc[0, 'A'] = False
+    first.save_changes(first_df, '2024-01-01', {'A': False})
+    second_df.loc[1, 'B'] = True
+    second.save_changes(second_df, '2024-01-02', {'B': True})
+    flush_writes()
+    flush_writes()  # Fold the change log in, so the CSV alone has the result
+
+    df = CsvStorage(directory=str(tmp_path)).load()
+    assert df['A'].tolist() == [False, True]
+    assert df['B'].tolist() == [False, True]
+
+def test_repeated_toggles_coalesce(tmp_path, write_behind):
+    habit_storage = CsvStorage(directory=str(tmp_path))
+    habit_storage._save_now(habits_frame())
+    df = habit_storage.load()
+    before = write_behind_stats()
+    for value in (False, True, False):
+        habit_storage.save_changes(df, '2024-01-01', {'A': value})
+    # Queued writes are visible to loads before they are written
+    assert habit_storage.load()['A'].tolist() == [False, True]
+    assert write_behind_stats()['queue_depth'] == 1
+    flush_writes()
+    after = write_behind_stats()
+    assert after['enqueued'] - before['enqueued'] == 3
+    assert after['written'] - before['written'] == 1
+    assert CsvStorage(directory=str(tmp_path)).load()['A'].tolist() == [False, True]
+
+def test_failed_write_is_counted_and_requeued(tmp_path, monkeypatch, write_behind):
+    monkeypatch.setattr(storage, 'PERSISTENCE_MODE', 'rewrite')
+    habit_storage = CsvStorage(directory=str(tmp_path))
+    df = habits_frame()
+    habit_storage.save_changes(df, '2024-01-01', {'A': False})
+
+    def fail(path, write):
+        raise OSError("disk full")
+    with monkeypatch.context() as patch:
+        patch.setattr(storage, '_atomic_write', fail)
+        before = write_behind_stats()
+        flush_writes()
+        after = write_behind_stats()
+    assert after['errors'] - before['errors'] == 1
+    assert after['written'] == before['written']
+    assert after['queue_depth'] == 1
+    assert not (tmp_path / 'habits.csv').exists()
+
+    flush_writes()
+    assert write_behind_stats()['queue_depth'] == 0
+    assert CsvStorage(directory=str(tmp_path)).load()['A'].tolist() == [False, True]